@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class EcommerceConfig(AppConfig):
     name = 'ecommerce'
+
+    def ready(self):
+        from ecommerce import signals     # NOQA
+        from ecommerce.search import create_search_table
+        post_migrate.connect(create_search_table, sender=self)
@@ -0,0 +1,107 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class VersionedCache:
+    """
+    Cache for data that is read on almost every request but rarely changes.
+
+    Values are stored in the cache named by the ECOMMERCE_CACHE setting and,
+    unless `local` is False, in a process-local dict as well. Both are keyed
+    by a version which lives in the shared cache; invalidate() replaces the
+    version so that every process rebuilds the value on its next read.
+
+    Versions and values expire after `timeout` seconds (ECOMMERCE_CACHE_TIMEOUT
+    by default), which bounds how stale a process can get when the cache is
+    not shared between processes, e.g. LocMemCache.
+    """
+    _missing = object()
+
+    def __init__(self, name, local=True, timeout=None):
+        self.name = name
+        self.local = local
+        self._timeout = timeout
+        self._local_values = {}
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'ECOMMERCE_CACHE', 'default')]
+
+    @property
+    def timeout(self):
+        if self._timeout is not None:
+            return self._timeout
+        return getattr(settings, 'ECOMMERCE_CACHE_TIMEOUT', 300)
+
+    def get_version_key(self):
+        return 'ecommerce:{0}:version'.format(self.name)
+
+    def get_version(self):
+        version_key = self.get_version_key()
+        version = self.cache.get(version_key)
+        if version is None:
+            self.cache.add(version_key, uuid.uuid4().hex, self.timeout)
+            version = self.cache.get(version_key)
+        # None when the cache backend does not store anything, e.g. DummyCache
+        return version
+
+    def invalidate(self):
+        self.cache.set(self.get_version_key(), uuid.uuid4().hex, self.timeout)
+        self._local_values = {}
+
+    def peek(self, key=''):
+        """
+        Returns the cached value for `key` without building it, or None
+        when it is not cached
+        """
+        version = self.cache.get(self.get_version_key())
+        if version is None:
+            return None
+        if self.local:
+            local_version, value = self._local_values.get(key, (None, None))
+            if local_version == version:
+                return value
+        return self.cache.get('ecommerce:{0}:{1}:{2}'.format(self.name, version, key))
+
+    def delete(self, key=''):
+        """
+        Removes the value of a single key, without changing the version
+        """
+        self._local_values.pop(key, None)
+        version = self.cache.get(self.get_version_key())
+        if version is not None:
+            self.cache.delete('ecommerce:{0}:{1}:{2}'.format(self.name, version, key))
+
+    def get_or_build(self, build, key=''):
+        """
+        Returns the cached value for `key`, calling `build` to create it
+        when the value is missing or was invalidated
+        """
+        version = self.get_version()
+        if version is None:
+            return build()
+
+        if self.local:
+            local_version, value = self._local_values.get(key, (None, None))
+            if local_version == version:
+                return value
+
+        cache_key = 'ecommerce:{0}:{1}:{2}'.format(self.name, version, key)
+        value = self.cache.get(cache_key, self._missing)
+        if value is self._missing:
+            value = build()
+            self.cache.set(cache_key, value, self.timeout)
+
+        if self.local:
+            self._local_values[key] = (version, value)
+        return value
+
+
+category_list_cache = VersionedCache('category_list')
+banner_list_cache = VersionedCache('banner_list')
+# Pages rendered for anonymous visitors, versioned by any catalog change
+catalog_page_cache = VersionedCache('catalog_page', local=False, timeout=60)
+# Cart totals per user, deleted when the cart changes and versioned by product changes
+cart_summary_cache = VersionedCache('cart_summary', local=False)
@@ -0,0 +1,274 @@
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+from ecommerce.cache import cart_summary_cache
+from ecommerce.models import Product, Cart, CartSummary
+
+CART_MAX_AGE = 60 * 60 * 24 * 14
+
+
+class CartItem:
+    """
+    Item of a cart that is not stored in the Cart table
+    """
+
+    def __init__(self, product, quantity):
+        self.product = product
+        self.product_id = product.pk
+        self.quantity = quantity
+
+
+class BaseCartStorage:
+    """
+    Where the shopping cart of a visitor is kept.
+
+    Items returned by get_items() have `product`, `product_id` and
+    `quantity` attributes, like Cart rows.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    def get_items(self):
+        raise NotImplementedError
+
+    def add(self, product_id):
+        """
+        Adds one unit of the product, returns False when it is out of stock
+        and raises Product.DoesNotExist when there is no such product
+        """
+        raise NotImplementedError
+
+    def remove(self, product_id):
+        """
+        Removes the product, returns False when it was not in the cart
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def get_summary(self):
+        """
+        CartSummary with the item count, subtotal and discounted total
+        """
+        raise NotImplementedError
+
+    def update(self, response):
+        """
+        Saves the changes that are kept in the response, e.g. in a cookie
+        """
+
+
+class DatabaseCartStorage(BaseCartStorage):
+    """
+    Cart of a logged in user, stored in the Cart table
+    """
+
+    def get_queryset(self):
+        return Cart.objects.filter(user=self.request.user)
+
+    def get_items(self):
+        return list(self.get_queryset().select_related('product').prefetch_related(
+            Product.featured_image_prefetch('product__image_set')).order_by('pk'))
+
+    def add(self, product_id):
+        added = Cart.objects.add_product(self.request.user, product_id)
+        if added:
+            cart_summary_cache.delete(key=self.request.user.pk)
+        return added
+
+    def remove(self, product_id):
+        deleted, _ = self.get_queryset().filter(product_id=product_id).delete()
+        cart_summary_cache.delete(key=self.request.user.pk)
+        return deleted > 0
+
+    def clear(self):
+        self.get_queryset().delete()
+        cart_summary_cache.delete(key=self.request.user.pk)
+
+    def get_summary(self):
+        return cart_summary_cache.get_or_build(
+            self.get_queryset().summary, key=self.request.user.pk)
+
+
+class AnonymousCartStorage(BaseCartStorage):
+    """
+    Cart kept outside of the database as a {product pk: quantity} dict,
+    so that browsing visitors do not write to the Cart table
+    """
+
+    def __init__(self, request):
+        super(AnonymousCartStorage, self).__init__(request)
+        self._quantities = None
+        self.changed = False
+
+    def load(self):
+        raise NotImplementedError
+
+    def save(self, quantities, response):
+        raise NotImplementedError
+
+    @property
+    def quantities(self):
+        if self._quantities is None:
+            try:
+                self._quantities = {
+                    int(product_id): int(quantity)
+                    for product_id, quantity in (self.load() or {}).items()}
+            except (AttributeError, TypeError, ValueError):
+                self._quantities = {}
+        return self._quantities
+
+    def get_items(self):
+        if not self.quantities:
+            return []
+        products = Product.objects.with_featured_image().in_bulk(list(self.quantities))
+        return [CartItem(products[product_id], quantity)
+                for product_id, quantity in sorted(self.quantities.items())
+                if product_id in products]
+
+    def add(self, product_id):
+        stock = Product.objects.filter(pk=product_id).values_list('quantity', flat=True).first()
+        if stock is None:
+            raise Product.DoesNotExist("Product matching query does not exist.")
+        quantity = self.quantities.get(product_id, 0)
+        if quantity >= stock:
+            return False
+        self.quantities[product_id] = quantity + 1
+        self.changed = True
+        return True
+
+    def remove(self, product_id):
+        if self.quantities.pop(product_id, None) is None:
+            return False
+        self.changed = True
+        return True
+
+    def clear(self):
+        self._quantities = {}
+        self.changed = True
+
+    def get_summary(self):
+        items = self.get_items()
+        return CartSummary(
+            sum(item.quantity for item in items),
+            sum(item.product.price * item.quantity for item in items),
+            sum(item.product.discount_price * item.quantity for item in items))
+
+    def update(self, response):
+        if self.changed:
+            self.save({str(product_id): quantity
+                       for product_id, quantity in self.quantities.items()}, response)
+
+
+class SignedCookieCartStorage(AnonymousCartStorage):
+    """
+    Keeps the cart in a signed cookie
+    """
+    cookie_name = 'cart'
+    salt = 'ecommerce.carts.SignedCookieCartStorage'
+
+    def load(self):
+        data = self.request.get_signed_cookie(
+            self.cookie_name, default=None, salt=self.salt, max_age=CART_MAX_AGE)
+        return json.loads(data) if data else None
+
+    def save(self, quantities, response):
+        if not quantities:
+            response.delete_cookie(self.cookie_name)
+            return
+        response.set_signed_cookie(
+            self.cookie_name, json.dumps(quantities), salt=self.salt, max_age=CART_MAX_AGE,
+            httponly=True, samesite='Lax')
+
+
+class CacheCartStorage(AnonymousCartStorage):
+    """
+    Keeps the cart in the ECOMMERCE_CACHE cache, the visitor only gets a
+    signed cookie with the id of the cart
+    """
+    cookie_name = 'cart_id'
+    salt = 'ecommerce.carts.CacheCartStorage'
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'ECOMMERCE_CACHE', 'default')]
+
+    def get_cart_id(self):
+        return self.request.get_signed_cookie(
+            self.cookie_name, default=None, salt=self.salt, max_age=CART_MAX_AGE)
+
+    def get_cache_key(self, cart_id):
+        return 'ecommerce:cart:{0}'.format(cart_id)
+
+    def load(self):
+        cart_id = self.get_cart_id()
+        return self.cache.get(self.get_cache_key(cart_id)) if cart_id else None
+
+    def save(self, quantities, response):
+        cart_id = self.get_cart_id()
+        if not quantities:
+            if cart_id:
+                self.cache.delete(self.get_cache_key(cart_id))
+                response.delete_cookie(self.cookie_name)
+            return
+        if cart_id is None:
+            cart_id = uuid.uuid4().hex
+        self.cache.set(self.get_cache_key(cart_id), quantities, CART_MAX_AGE)
+        response.set_signed_cookie(
+            self.cookie_name, cart_id, salt=self.salt, max_age=CART_MAX_AGE,
+            httponly=True, samesite='Lax')
+
+
+def get_anonymous_cart_storage(request):
+    storage_class = import_string(getattr(
+        settings, 'ECOMMERCE_ANONYMOUS_CART_STORAGE', 'ecommerce.carts.SignedCookieCartStorage'))
+    return storage_class(request)
+
+
+def get_cart(request):
+    """
+    Cart storage of the visitor, logged in users always use the database
+    """
+    if not hasattr(request, '_cart'):
+        if request.user.is_authenticated:
+            request._cart = DatabaseCartStorage(request)
+        else:
+            request._cart = get_anonymous_cart_storage(request)
+    return request._cart
+
+
+def merge_anonymous_cart(request, user):
+    """
+    Moves the cart kept while browsing anonymously into the user's database cart
+    """
+    anonymous_cart = get_anonymous_cart_storage(request)
+    if anonymous_cart.quantities:
+        Cart.objects.merge_quantities(user, anonymous_cart.quantities)
+        cart_summary_cache.delete(key=user.pk)
+        anonymous_cart.clear()
+        # Deletes the cookie of the anonymous cart in CartMiddleware
+        request._merged_cart = anonymous_cart
+    if hasattr(request, '_cart'):
+        del request._cart
+
+
+class CartMiddleware:
+    """
+    Saves the changes to the cart of the visitor in the response
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        for cart in (getattr(request, '_merged_cart', None), getattr(request, '_cart', None)):
+            if cart is not None:
+                cart.update(response)
+        return response
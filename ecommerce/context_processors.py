@@ -1,8 +1,13 @@
+from ecommerce.cache import category_list_cache
 from ecommerce.models import ProductCategory
 
 
+def get_category_list():
+    return list(ProductCategory.objects.all())
+
+
 def category_list(request):
     """
     Adds category_list to all pages, to create the list in navbar
     """
-    return {'category_list': ProductCategory.objects.all(), }
+    return {'category_list': category_list_cache.get_or_build(get_category_list), }
@@ -0,0 +1,106 @@
+import os
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from PIL import Image as PILImage
+
+# Widths of the resized copies, product cards are about 250px wide
+THUMBNAIL_WIDTHS = (250, 500)
+
+# Directory, next to the originals, holding their resized copies
+DERIVATIVES_DIR = 'derivatives'
+
+WEBP_EXTENSION = '.webp'
+
+_executor = None
+
+
+def get_derivative_path(image_path, width, extension=None):
+    """
+    Media relative path of a resized copy of the image, in the format of the
+    original unless another extension is given:
+    products/ball.jpg -> products/derivatives/ball-250.jpg
+    """
+    directory, filename = posixpath.split(str(image_path))
+    stem, original_extension = posixpath.splitext(filename)
+    return posixpath.join(directory, DERIVATIVES_DIR, '{0}-{1}{2}'.format(
+        stem, width, extension or original_extension))
+
+
+def get_derivatives(media_root, image_path):
+    """
+    (width, path, WebP path) of the resized copies of the image that exist
+    """
+    derivatives = []
+    for width in THUMBNAIL_WIDTHS:
+        path = get_derivative_path(image_path, width)
+        webp_path = get_derivative_path(image_path, width, WEBP_EXTENSION)
+        if (os.path.exists(os.path.join(media_root, path))
+                and os.path.exists(os.path.join(media_root, webp_path))):
+            derivatives.append((width, path, webp_path))
+    return derivatives
+
+
+def _save(image, path, image_format):
+    # Written aside and moved in place, a half written copy is never served
+    temporary_path = path + '.tmp'
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    image.save(temporary_path, image_format, quality=85)
+    os.replace(temporary_path, path)
+
+
+def make_derivatives(media_root, image_path, force=False):
+    """
+    Writes the resized and WebP copies of the image, returns how many were
+    written. Copies newer than the original are kept unless `force` is set.
+
+    Runs in worker processes, so it only depends on Pillow and the arguments.
+    """
+    source = os.path.join(media_root, str(image_path))
+    try:
+        source_mtime = os.path.getmtime(source)
+        with PILImage.open(source) as original:
+            original.load()
+    except (OSError, ValueError):
+        # Missing file, or not an image Pillow can read
+        return 0
+
+    os.makedirs(os.path.join(os.path.dirname(source), DERIVATIVES_DIR), exist_ok=True)
+    written = 0
+    for width in THUMBNAIL_WIDTHS:
+        resized = original.copy()
+        # thumbnail() keeps the aspect ratio and never enlarges the image
+        resized.thumbnail((width, width * 4))
+        for extension, image_format in ((None, original.format), (WEBP_EXTENSION, 'WEBP')):
+            path = os.path.join(media_root, get_derivative_path(image_path, width, extension))
+            if (not force and os.path.exists(path)
+                    and os.path.getmtime(path) >= source_mtime):
+                continue
+            _save(resized, path, image_format)
+            written += 1
+    return written
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=getattr(settings, 'ECOMMERCE_IMAGE_WORKERS', 2))
+    return _executor
+
+
+def schedule_derivatives(image_paths):
+    """
+    Makes the copies of the images in the background process pool, or right
+    away when ECOMMERCE_IMAGE_WORKERS is 0
+    """
+    media_root = settings.MEDIA_ROOT
+    image_paths = [str(image_path) for image_path in image_paths if image_path]
+    if getattr(settings, 'ECOMMERCE_IMAGE_WORKERS', 2) == 0:
+        for image_path in image_paths:
+            make_derivatives(media_root, image_path)
+        return
+    for image_path in image_paths:
+        get_executor().submit(make_derivatives, media_root, image_path)
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ecommerce.models import OrderList, Product
+
+
+class Command(BaseCommand):
+    help = 'Copy the product name, price, discount and image onto older order lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of order lines updated per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        # The current product is the best record left of what was paid
+        queryset = OrderList.objects.filter(unit_price__isnull=True).select_related(
+            'product').prefetch_related(Product.featured_image_prefetch('product__image_set'))
+
+        last_pk = 0
+        updated = 0
+        while True:
+            with transaction.atomic():
+                order_list = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+                if not order_list:
+                    break
+                for order_item in order_list:
+                    order_item.snapshot_product(order_item.product)
+                OrderList.objects.bulk_update(order_list, OrderList.SNAPSHOT_FIELDS)
+
+            last_pk = order_list[-1].pk
+            updated += len(order_list)
+            self.stdout.write("Updated {0} order lines".format(updated))
+
+        self.stdout.write(self.style.SUCCESS("Done, {0} order lines updated".format(updated)))
@@ -0,0 +1,50 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ecommerce.images import DERIVATIVES_DIR, WEBP_EXTENSION, make_derivatives
+
+
+class Command(BaseCommand):
+    help = 'Make the resized and WebP copies of the product images in media/products/'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Number of processes resizing images')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Make the copies again even when they are newer than the original')
+
+    def get_image_paths(self, media_root):
+        """
+        Media relative paths of the originals, the copies are left out
+        """
+        products_dir = os.path.join(media_root, 'products')
+        for directory, dirnames, filenames in os.walk(products_dir):
+            if DERIVATIVES_DIR in dirnames:
+                dirnames.remove(DERIVATIVES_DIR)
+            for filename in sorted(filenames):
+                if not filename.endswith(('.tmp', WEBP_EXTENSION)):
+                    path = os.path.relpath(os.path.join(directory, filename), media_root)
+                    yield path.replace(os.sep, '/')
+
+    def handle(self, *args, **options):
+        media_root = settings.MEDIA_ROOT
+        image_paths = list(self.get_image_paths(media_root))
+        media_roots = [media_root] * len(image_paths)
+        forces = [options['force']] * len(image_paths)
+
+        if options['workers'] <= 1:
+            results = map(make_derivatives, media_roots, image_paths, forces)
+            written = sum(results)
+        else:
+            with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+                results = executor.map(
+                    make_derivatives, media_roots, image_paths, forces, chunksize=16)
+                written = sum(results)
+
+        self.stdout.write(self.style.SUCCESS(
+            "Done, {0} images, {1} copies written".format(len(image_paths), written)))
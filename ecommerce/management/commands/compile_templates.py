@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from website.haml import compile_templates
+
+
+class Command(BaseCommand):
+    help = 'Convert the HAML templates to Django templates in COMPILED_TEMPLATES_DIR'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output-dir', default=settings.COMPILED_TEMPLATES_DIR,
+            help='Directory the templates are written to, COMPILED_TEMPLATES_DIR by default')
+
+    def handle(self, *args, **options):
+        compiled = 0
+        for name in compile_templates(options['output_dir']):
+            compiled += 1
+            if options['verbosity'] > 1:
+                self.stdout.write("Compiled {0}".format(name))
+        self.stdout.write(self.style.SUCCESS("Done, {0} templates compiled in {1}".format(
+            compiled, options['output_dir'])))
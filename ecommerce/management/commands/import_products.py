@@ -0,0 +1,193 @@
+import csv
+import itertools
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+
+from ecommerce.cache import catalog_page_cache
+from ecommerce.models import Product, ProductCategory
+from ecommerce.search import get_search_index
+
+# Columns of the feed, besides `name` and `category`, with their type
+PRODUCT_COLUMNS = {
+    'description': str,
+    'price': float,
+    'discount_percent': float,
+    'rating': int,
+    'quantity': int,
+}
+
+
+class Command(BaseCommand):
+    help = 'Import products from a CSV or JSONL feed, updating the products with the same name'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header row, or JSONL file')
+        parser.add_argument(
+            '--format', choices=['csv', 'jsonl'],
+            help='Format of the file, by default from its extension')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows imported per transaction')
+        parser.add_argument(
+            '--checkpoint',
+            help='File recording the rows imported so far, by default PATH.checkpoint')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Import the whole file again, ignoring the checkpoint')
+
+    def read_rows(self, path, file_format):
+        """
+        Yields the rows of the file as dicts, one at a time
+        """
+        with open(path, newline='', encoding='utf-8') as feed:
+            if file_format == 'csv':
+                yield from csv.DictReader(feed)
+                return
+            for line in feed:
+                line = line.strip()
+                try:
+                    row = json.loads(line) if line else {}
+                except ValueError:
+                    row = {}
+                yield row if isinstance(row, dict) else {}
+
+    def read_checkpoint(self, checkpoint_path, path):
+        try:
+            with open(checkpoint_path) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            raise CommandError("Cannot read checkpoint {0}: {1}".format(checkpoint_path, e))
+        if checkpoint.get('size') != os.path.getsize(path):
+            raise CommandError(
+                "{0} changed since the checkpoint was written, use --restart".format(path))
+        return checkpoint['rows']
+
+    def write_checkpoint(self, checkpoint_path, path, rows):
+        # Replaces the file at once, an interruption cannot leave half a checkpoint
+        temporary_path = checkpoint_path + '.tmp'
+        with open(temporary_path, 'w') as checkpoint_file:
+            json.dump({'path': os.path.abspath(path), 'size': os.path.getsize(path),
+                       'rows': rows}, checkpoint_file)
+        os.replace(temporary_path, checkpoint_path)
+
+    def get_category(self, name):
+        """
+        Category from the in-memory map, created when the feed has a new one
+        """
+        if not name:
+            return None
+        if name not in self.categories:
+            self.categories[name] = ProductCategory.objects.using(self.using).create(name=name)
+        return self.categories[name]
+
+    def parse_row(self, row):
+        """
+        Field values of the product in the row, None when the row is invalid
+        """
+        name = str(row.get('name') or '').strip()
+        if not name or len(name) > Product._meta.get_field('name').max_length:
+            return None
+        values = {'name': name}
+        try:
+            for column, column_type in PRODUCT_COLUMNS.items():
+                if row.get(column) not in (None, ''):
+                    values[column] = column_type(row[column])
+        except (TypeError, ValueError):
+            return None
+        if 'category' in row:
+            values['category'] = str(row['category'] or '').strip()
+        return values
+
+    def import_batch(self, batch):
+        """
+        Upserts the products of the batch by name: one query finds the
+        existing products, one bulk_update and one bulk_create write them
+        """
+        # Rows of the same name are merged, the values of the last one win
+        rows = batch
+        batch = {}
+        for values in rows:
+            batch.setdefault(values['name'], {}).update(values)
+        for values in batch.values():
+            if 'category' in values:
+                values['category'] = self.get_category(values['category'])
+
+        with transaction.atomic(using=self.using):
+            products = Product.objects.using(self.using)
+            existing = {product.name: product for product in products.filter(name__in=batch)}
+            updated_fields = set()
+            for name, product in existing.items():
+                for field, value in batch[name].items():
+                    setattr(product, field, value)
+                    updated_fields.add(field)
+            updated_fields.discard('name')
+            if existing and updated_fields:
+                products.bulk_update(list(existing.values()), sorted(updated_fields))
+
+            new = [Product(**values) for name, values in batch.items() if name not in existing]
+            new = products.bulk_create(new)
+            if new and not connections[self.using].features.can_return_rows_from_bulk_insert:
+                # The names are new, so they find the rows that were just inserted
+                new = list(products.filter(name__in=[product.name for product in new]))
+
+            # bulk_create and bulk_update do not send the signals indexing the products
+            get_search_index(self.using).index(list(existing.values()) + new)
+        return len(existing), len(new)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError("{0} does not exist".format(path))
+        file_format = options['format'] or (
+            'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        checkpoint_path = options['checkpoint'] or path + '.checkpoint'
+        batch_size = options['batch_size']
+
+        self.using = router.db_for_write(Product)
+        self.categories = {
+            category.name: category
+            for category in ProductCategory.objects.using(self.using).all()}
+
+        done = 0 if options['restart'] else self.read_checkpoint(checkpoint_path, path)
+        if done:
+            self.stdout.write("Resuming after row {0}".format(done))
+
+        rows = itertools.islice(self.read_rows(path, file_format), done, None)
+        resumed_at = done
+        created = updated = skipped = 0
+        started = time.monotonic()
+        while True:
+            chunk = list(itertools.islice(rows, batch_size))
+            if not chunk:
+                break
+            batch = []
+            for row in chunk:
+                values = self.parse_row(row)
+                if values is None:
+                    skipped += 1
+                else:
+                    batch.append(values)
+            if batch:
+                batch_updated, batch_created = self.import_batch(batch)
+                updated += batch_updated
+                created += batch_created
+            done += len(chunk)
+            self.write_checkpoint(checkpoint_path, path, done)
+
+            elapsed = time.monotonic() - started
+            self.stdout.write("{0} rows, {1:.0f} rows/s".format(
+                done, (done - resumed_at) / elapsed if elapsed else 0))
+
+        catalog_page_cache.invalidate()
+        # The file is fully imported, running the command again starts over
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(
+            "Done, {0} products created, {1} updated, {2} rows skipped".format(
+                created, updated, skipped)))
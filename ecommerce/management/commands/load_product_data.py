@@ -1,19 +1,39 @@
-import requests
-import random
 import json
+import os
+import random
+import shutil
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from urllib.error import HTTPError, URLError
 
-from django.core.management.base import BaseCommand
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+
+from ecommerce.cache import catalog_page_cache
+from ecommerce.images import schedule_derivatives
 from ecommerce.models import Product, ProductCategory, Image
-from website import settings
+from ecommerce.search import get_search_index
 
 
 class Command(BaseCommand):
-    help = 'Populate db with product data from fixture'
+    help = 'Populate db with product data from randomlists.com or from a local source'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            help='JSON file, or directory with a products.json file, listing products as '
+                 '{"name": ..., "description": ..., "image": path relative to the file}')
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Number of descriptions and images fetched at the same time')
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Number of products inserted per transaction')
 
     def get_description(self):
-        return requests.get('https://loripsum.net/api').text
+        return requests.get('https://loripsum.net/api', timeout=10).text
 
     def get_image(self, image_prefix, image_suffix, name):
         image_name = "{0}{1}".format(name, image_suffix)
@@ -28,44 +48,132 @@ class Command(BaseCommand):
         except URLError:
             return None, None
 
-    def handle(self, *args, **options):
-
-        categories = ProductCategory.objects.all()
+    def copy_image(self, source_path):
+        image_name = os.path.basename(source_path)
+        image_path = os.path.join(settings.MEDIA_ROOT, 'products', image_name)
+        try:
+            shutil.copyfile(source_path, image_path)
+            return image_name, "products/{0}".format(image_name)
+        except OSError:
+            return None, None
 
-        r = requests.get('https://www.randomlists.com/data/things.json')
+    def get_remote_items(self):
+        """
+        Product names from randomlists.com, with functions fetching the
+        description and image of each
+        """
+        r = requests.get('https://www.randomlists.com/data/things.json', timeout=10)
         random_list_json = json.loads(r.text)
 
-        items = random_list_json['RandL']['items']
-
         image_prefix = random_list_json["RandL"]['meta']['img']['prefix']
         image_suffix = random_list_json["RandL"]['meta']['img']['suffix']
 
-        for name in items:
-
-            if Product.objects.filter(name=name).count() > 0:
-                continue
+        def fetch(name):
+            image_name, image_path = self.get_image(image_prefix, image_suffix, name)
+            if image_name is None:
+                return None
+            return self.get_description(), image_name, image_path
 
-            description = self.get_description()
-            random_category = categories[random.randint(0, categories.count() - 1)]
+        return [(name, lambda name=name: fetch(name))
+                for name in random_list_json['RandL']['items']]
 
-            image_name, image_path = self.get_image(image_prefix, image_suffix, name)
+    def get_local_items(self, source):
+        if os.path.isdir(source):
+            source = os.path.join(source, 'products.json')
+        try:
+            with open(source) as source_file:
+                products = json.load(source_file)
+        except (OSError, ValueError) as e:
+            raise CommandError("Cannot read {0}: {1}".format(source, e))
+        base_dir = os.path.dirname(os.path.abspath(source))
+
+        def fetch(product):
+            image_name = image_path = None
+            if product.get('image'):
+                image_name, image_path = self.copy_image(
+                    os.path.join(base_dir, product['image']))
+                if image_name is None:
+                    return None
+            return product.get('description', ''), image_name, image_path
+
+        return [(product['name'], lambda product=product: fetch(product))
+                for product in products]
+
+    def create_products(self, batch, categories, using):
+        """
+        Inserts a batch of (name, description, image name, image path) with
+        one INSERT for the products and one for the images
+        """
+        with transaction.atomic(using=using):
+            products = Product.objects.using(using).bulk_create([
+                Product(
+                    name=name,
+                    description=description,
+                    price=random.randint(89, 1000),
+                    discount_percent=random.randint(0, 100),
+                    rating=random.randint(0, 5),
+                    quantity=random.randint(1, 10000),
+                    category=random.choice(categories) if categories else None
+                )
+                for name, description, _, _ in batch])
+            if not connections[using].features.can_return_rows_from_bulk_insert:
+                # The names are new, so they find the rows that were just inserted
+                products = list(Product.objects.using(using).filter(
+                    name__in=[product.name for product in products]))
+            pks = {product.name: product.pk for product in products}
+
+            images = Image.objects.using(using).bulk_create([
+                Image(
+                    product_id=pks[name],
+                    name=image_name,
+                    image_path=image_path,
+                    image_type=Image.FEATURED_IMAGE
+                )
+                for name, _, image_name, image_path in batch if image_name is not None])
+
+            # bulk_create does not send the post_save signals indexing the
+            # products and resizing the images
+            get_search_index(using).index(products)
+            image_paths = [image.image_path for image in images]
+            transaction.on_commit(lambda: schedule_derivatives(image_paths), using=using)
 
-            if image_name is None:
-                continue
-
-            product = Product.objects.create(
-                name=str(name).capitalize(),
-                description=description,
-                price=random.randint(89, 1000),
-                discount_percent=random.randint(0, 100),
-                rating=random.randint(0, 5),
-                quantity=random.randint(1, 10000),
-                category=random_category
-            )
-
-            Image.objects.create(
-                product=product,
-                name=image_name,
-                image_path=image_path,
-                featured_image=True
-            )
+    def handle(self, *args, **options):
+        using = router.db_for_write(Product)
+        categories = list(ProductCategory.objects.using(using).all())
+
+        if options['source']:
+            items = self.get_local_items(options['source'])
+        else:
+            os.makedirs(os.path.join(settings.MEDIA_ROOT, 'products'), exist_ok=True)
+            items = self.get_remote_items()
+
+        # Names are stored capitalized, skip the ones already in the database or listed twice
+        names = [str(name).capitalize() for name, _ in items]
+        existing = set(Product.objects.using(using).filter(
+            name__in=names).values_list('name', flat=True))
+        new_items = []
+        for name, (_, fetch) in zip(names, items):
+            if name not in existing:
+                existing.add(name)
+                new_items.append((name, fetch))
+
+        created = 0
+        batch = []
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            # Fetching goes on in the pool while the batches are inserted
+            results = executor.map(lambda item: item[1](), new_items)
+            for (name, _), result in zip(new_items, results):
+                if result is not None:
+                    batch.append((name,) + result)
+                if len(batch) == options['batch_size']:
+                    self.create_products(batch, categories, using)
+                    created += len(batch)
+                    batch = []
+                    self.stdout.write("Created {0} products".format(created))
+            if batch:
+                self.create_products(batch, categories, using)
+                created += len(batch)
+
+        catalog_page_cache.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            "Done, {0} products created, {1} skipped".format(created, len(items) - created)))
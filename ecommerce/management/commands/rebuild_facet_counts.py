@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.models import ProductFacetCount
+
+
+class Command(BaseCommand):
+    help = 'Count the products of every catalog filter again'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=None, help='Database alias to count')
+
+    def handle(self, *args, **options):
+        queryset = ProductFacetCount.objects.all()
+        if options['database']:
+            queryset = queryset.using(options['database'])
+        queryset.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            "Done, {0} facet combinations".format(queryset.count())))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.search import FTS5SearchIndex, get_search_index
+
+
+class Command(BaseCommand):
+    help = 'Index the name and description of all the products for search'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of products indexed per transaction')
+        parser.add_argument('--database', default=None, help='Database alias to index')
+
+    def handle(self, *args, **options):
+        search_index = get_search_index(options['database'])
+        if isinstance(search_index, FTS5SearchIndex):
+            search_index.create_table()
+
+        indexed = 0
+        for count in search_index.rebuild(batch_size=options['batch_size']):
+            indexed += count
+            self.stdout.write("Indexed {0} products".format(indexed))
+
+        self.stdout.write(self.style.SUCCESS(
+            "Done, {0} products indexed with {1}".format(
+                indexed, search_index.__class__.__name__)))
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:23
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    """
+    Merges rows of the same product in a user's cart, so the unique constraint can be added
+    """
+    Cart = apps.get_model('ecommerce', 'Cart')
+    duplicates = Cart.objects.values('user', 'product').annotate(
+        rows=Count('pk'), total=Sum('quantity')).filter(rows__gt=1)
+    for duplicate in duplicates:
+        items = Cart.objects.filter(
+            user=duplicate['user'], product=duplicate['product']).order_by('pk')
+        kept = items.first()
+        items.exclude(pk=kept.pk).delete()
+        Cart.objects.filter(pk=kept.pk).update(quantity=duplicate['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('ecommerce', '0009_remove_image_featured_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='cart',
+            unique_together={('user', 'product')},
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0010_cart_unique_user_product'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'date'], name='ecommerce_o_user_id_209825_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0011_order_user_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderlist',
+            name='discount_percent',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='orderlist',
+            name='image_path',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='orderlist',
+            name='product_name',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='orderlist',
+            name='unit_price',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
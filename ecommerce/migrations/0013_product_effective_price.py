@@ -0,0 +1,40 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:32
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import F, Value
+from django.db.models.functions import Cast, Floor
+
+
+def fill_effective_price(apps, schema_editor):
+    """
+    Computes the effective price of the existing products in one UPDATE
+    """
+    Product = apps.get_model('ecommerce', 'Product')
+    Product.objects.update(effective_price=Cast(
+        F('price') - Floor(F('price') * F('discount_percent') / Value(100.0)),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0012_orderlist_product_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12),
+        ),
+        migrations.RunPython(fill_effective_price, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['effective_price', 'id'], name='ecommerce_p_effecti_807aa4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'effective_price', 'id'], name='ecommerce_p_categor_0ca8a2_idx'),
+        ),
+    ]
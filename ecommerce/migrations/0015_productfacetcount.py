@@ -0,0 +1,59 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:40
+
+from django.db import migrations, models
+from django.db.models import Case, Count, Value, When
+from django.db.models.functions import Coalesce
+
+# PRICE_BANDS of ecommerce.models when the table was added
+PRICE_BANDS = (0, 100, 500, 1000, 5000)
+
+
+def count_products(apps, schema_editor):
+    Product = apps.get_model('ecommerce', 'Product')
+    ProductFacetCount = apps.get_model('ecommerce', 'ProductFacetCount')
+    rows = Product.objects.annotate(
+        facet_price_band=Case(
+            *[When(effective_price__gte=low, then=Value(price_band))
+              for price_band, low in reversed(list(enumerate(PRICE_BANDS)))],
+            default=Value(0), output_field=models.IntegerField()),
+        facet_rating=Coalesce('rating', Value(0)),
+        facet_in_stock=Case(
+            When(quantity__gt=0, then=Value(True)), default=Value(False),
+            output_field=models.BooleanField()),
+    ).order_by().values_list(
+        'category_id', 'facet_price_band', 'facet_rating', 'facet_in_stock',
+    ).annotate(count=Count('pk'))
+    counts = {}
+    for category_id, price_band, rating, in_stock, count in rows:
+        key = (category_id or 0, price_band, rating, bool(in_stock))
+        counts[key] = counts.get(key, 0) + count
+    ProductFacetCount.objects.bulk_create([
+        ProductFacetCount(
+            category=category, price_band=price_band, rating=rating, in_stock=in_stock,
+            count=count)
+        for (category, price_band, rating, in_stock), count in counts.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0014_productsearchterm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacetCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.IntegerField()),
+                ('price_band', models.SmallIntegerField()),
+                ('rating', models.SmallIntegerField()),
+                ('in_stock', models.BooleanField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('category', 'price_band', 'rating', 'in_stock')},
+            },
+        ),
+        migrations.RunPython(count_products, migrations.RunPython.noop),
+    ]
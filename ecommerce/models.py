@@ -1,6 +1,14 @@
-from django.db import models
+import bisect
+from collections import Counter, namedtuple
+from decimal import Decimal
+
+from django.db import models, transaction, connections, router, IntegrityError
+from django.db.models import F, Q, Case, When, Value, Count, Sum, ExpressionWrapper, FloatField
+from django.db.models.functions import Cast, Coalesce, Floor
 from django.urls import reverse
 
+from ecommerce.cache import catalog_page_cache
+
 from registration.models import User
 
 
@@ -14,6 +22,185 @@ class ProductCategory(models.Model):
         return self.name
 
 
+def get_effective_price(price, discount_percent):
+    """
+    Price after the discount as an exact Decimal, rounded down to a whole
+    number of rupees like Product.discount_price
+    """
+    effective_price = price - int(price * (discount_percent / 100))
+    return Decimal(str(effective_price)).quantize(Decimal('0.01'))
+
+
+def get_effective_price_expression(price=F('price'), discount_percent=F('discount_percent')):
+    """
+    SQL equivalent of get_effective_price, for UPDATE statements
+    """
+    if not hasattr(price, 'resolve_expression'):
+        price = Value(price)
+    if not hasattr(discount_percent, 'resolve_expression'):
+        discount_percent = Value(discount_percent)
+    return Cast(
+        price - Floor(price * discount_percent / Value(100.0)),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2))
+
+
+# Lower bounds of the price bands of the catalog filters, in rupees
+PRICE_BANDS = (0, 100, 500, 1000, 5000)
+
+
+def get_price_band(effective_price):
+    return max(bisect.bisect_right(PRICE_BANDS, effective_price) - 1, 0)
+
+
+def get_price_band_range(price_band):
+    """
+    (lowest price, highest price excluded) of the band, None when unbounded
+    """
+    if price_band + 1 < len(PRICE_BANDS):
+        return PRICE_BANDS[price_band], PRICE_BANDS[price_band + 1]
+    return PRICE_BANDS[price_band], None
+
+
+def get_price_band_expression():
+    return Case(
+        *[When(effective_price__gte=low, then=Value(price_band))
+          for price_band, low in reversed(list(enumerate(PRICE_BANDS)))],
+        default=Value(0), output_field=models.IntegerField())
+
+
+def get_facet_deltas(before, after):
+    """
+    Changes of the facet counts between two {facet key: count} dicts
+    """
+    deltas = Counter(after)
+    deltas.subtract(before)
+    return {key: delta for key, delta in deltas.items() if delta}
+
+
+# Product fields that change the facet key of a product
+FACET_FIELDS = {'category', 'category_id', 'price', 'discount_percent', 'rating', 'quantity'}
+
+
+class ProductQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        # Keep effective_price in sync in the same statement
+        if 'price' in kwargs or 'discount_percent' in kwargs:
+            kwargs['effective_price'] = get_effective_price_expression(
+                kwargs.get('price', F('price')),
+                kwargs.get('discount_percent', F('discount_percent')))
+        if not FACET_FIELDS & set(kwargs):
+            return super(ProductQuerySet, self).update(**kwargs)
+
+        # Moves the counts of the updated rows from their old facets to the new ones
+        using = self._db or router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            pks = list(self.using(using).values_list('pk', flat=True))
+            before = Product.objects.using(using).get_facet_counts_of(pks)
+            updated = super(ProductQuerySet, self).update(**kwargs)
+            after = Product.objects.using(using).get_facet_counts_of(pks)
+            ProductFacetCount.objects.using(using).add(get_facet_deltas(before, after))
+        return updated
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.update_effective_price()
+        using = self._db or router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            objs = super(ProductQuerySet, self).bulk_create(objs, *args, **kwargs)
+            ProductFacetCount.objects.using(using).add(
+                Counter(obj.get_facet_key() for obj in objs))
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        fields = list(fields)
+        if 'price' in fields or 'discount_percent' in fields:
+            objs = list(objs)
+            for obj in objs:
+                obj.update_effective_price()
+            if 'effective_price' not in fields:
+                fields.append('effective_price')
+        return super(ProductQuerySet, self).bulk_update(objs, fields, *args, **kwargs)
+
+    def get_facet_counts(self):
+        """
+        {(category pk or 0, price band, rating or 0, in stock): number of products}
+        with one GROUP BY query
+        """
+        rows = self.annotate(
+            facet_price_band=get_price_band_expression(),
+            facet_rating=Coalesce('rating', Value(0)),
+            facet_in_stock=Case(
+                When(quantity__gt=0, then=Value(True)), default=Value(False),
+                output_field=models.BooleanField()),
+        ).order_by().values_list(
+            'category_id', 'facet_price_band', 'facet_rating', 'facet_in_stock',
+        ).annotate(count=Count('pk'))
+        counts = Counter()
+        for category_id, price_band, rating, in_stock, count in rows:
+            counts[(category_id or 0, price_band, rating, bool(in_stock))] += count
+        return counts
+
+    def get_facet_counts_of(self, pks, batch_size=500):
+        counts = Counter()
+        for i in range(0, len(pks), batch_size):
+            counts.update(self.filter(pk__in=pks[i:i + batch_size]).get_facet_counts())
+        return counts
+
+    def with_featured_image(self):
+        """
+        Fetches the featured image of every product in the queryset with one
+        extra query, instead of one query per product
+        """
+        return self.prefetch_related(Product.featured_image_prefetch())
+
+    def reduce_quantities(self, quantities):
+        """
+        Decrements the stock of many products in one UPDATE statement.
+
+        `quantities` maps product pks to the quantity ordered. Either every
+        product has enough stock and is decremented, or nothing is changed
+        and False is returned.
+        """
+        if not quantities or any(quantity <= 0 for quantity in quantities.values()):
+            return False
+
+        pks = sorted(quantities)
+        enough_stock = Q()
+        for pk in pks:
+            enough_stock |= Q(pk=pk, quantity__gte=quantities[pk])
+        ordered_quantity = Case(
+            *[When(pk=pk, then=Value(quantities[pk])) for pk in pks],
+            output_field=models.IntegerField())
+
+        using = self._db or router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            if connections[using].features.has_select_for_update:
+                # Lock the rows in pk order, so concurrent checkouts cannot deadlock
+                list(self.select_for_update().using(using).filter(pk__in=pks)
+                     .order_by('pk').values_list('pk', flat=True))
+            # Plain UPDATE, only the products running out of stock change facets
+            updated = super(ProductQuerySet, self.filter(enough_stock).using(using)).update(
+                quantity=F('quantity') - ordered_quantity)
+            if updated != len(pks):
+                # Some product is short on stock, undo the rows that were decremented
+                transaction.set_rollback(True, using=using)
+                return False
+
+            sold_out = self.using(using).filter(pk__in=pks, quantity__lte=0).get_facet_counts()
+            deltas = Counter()
+            for (category_id, price_band, rating, _), count in sold_out.items():
+                deltas[(category_id, price_band, rating, True)] -= count
+                deltas[(category_id, price_band, rating, False)] += count
+            ProductFacetCount.objects.using(using).add(deltas)
+
+        # The catalog shows "Out of Stock" for these products now
+        if sold_out:
+            catalog_page_cache.invalidate()
+        return True
+
+
 class Product(models.Model):
     """
     Describes each product
@@ -26,6 +213,52 @@ class Product(models.Model):
     quantity = models.IntegerField(default=0)
     category = models.ForeignKey(
         ProductCategory, on_delete=models.DO_NOTHING, blank=True, null=True)
+    # price after discount, kept in sync by save() and ProductQuerySet so that
+    # the catalog can be sorted and filtered by it in the database
+    effective_price = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal('0.00'), editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['effective_price', 'id']),
+            models.Index(fields=['category', 'effective_price', 'id']),
+        ]
+
+    @staticmethod
+    def featured_image_prefetch(lookup='image_set'):
+        """
+        Prefetch of the featured images, for querysets of products or of
+        models related to products (e.g. 'product__image_set')
+        """
+        return models.Prefetch(
+            lookup,
+            queryset=Image.objects.filter(image_type=Image.FEATURED_IMAGE).order_by('pk'),
+            to_attr='featured_image_list')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Product, cls).from_db(db, field_names, values)
+        # Facet of the row in the database, for the facet counts on save
+        if FACET_ATTNAMES.issubset(field_names):
+            instance._loaded_facet_key = instance.get_facet_key()
+        return instance
+
+    def get_facet_key(self):
+        return (self.category_id or 0, get_price_band(self.effective_price), self.rating or 0,
+                self.quantity > 0)
+
+    def update_effective_price(self):
+        self.effective_price = get_effective_price(self.price, self.discount_percent)
+
+    def save(self, *args, **kwargs):
+        self.update_effective_price()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and (
+                'price' in update_fields or 'discount_percent' in update_fields):
+            kwargs['update_fields'] = list(update_fields) + ['effective_price']
+        super(Product, self).save(*args, **kwargs)
 
     def get_absolute_url(self):     # pragma: no cover
         return reverse('product-detail', args=[str(self.pk)])
@@ -44,15 +277,22 @@ class Product(models.Model):
 
     @property
     def featured_image(self):
-        image = self.image_set.filter(image_type=Image.FEATURED_IMAGE)
-        if image.count() > 0:
-            return image[0].image_path
+        # Use the images attached by ProductQuerySet.with_featured_image when available
+        if hasattr(self, 'featured_image_list'):
+            images = self.featured_image_list
+        else:
+            images = self.image_set.filter(image_type=Image.FEATURED_IMAGE).order_by('pk')[:1]
+        for image in images:
+            return image.image_path
         return None
 
     def reduce_quantity(self, order_quantity):
-        if 0 < order_quantity <= self.quantity:
+        """
+        Decrements the stock in the database if there is enough of it,
+        without reading or saving the rest of the row
+        """
+        if Product.objects.reduce_quantities({self.pk: order_quantity}):
             self.quantity -= order_quantity
-            self.save()
             return True
         return False
 
@@ -60,6 +300,115 @@ class Product(models.Model):
         return self.name
 
 
+FACET_ATTNAMES = {'category_id', 'effective_price', 'rating', 'quantity'}
+
+
+class ProductFacetCountQuerySet(models.QuerySet):
+    FACETS = ('category', 'price_band', 'rating', 'in_stock')
+
+    def add(self, deltas):
+        """
+        Adds the {facet key: delta} changes, one UPDATE (or INSERT) per key
+        """
+        using = self._db or router.db_for_write(self.model)
+        for key, delta in deltas.items():
+            if not delta:
+                continue
+            facets = dict(zip(self.FACETS, key))
+            queryset = self.using(using).filter(**facets)
+            if not queryset.update(count=F('count') + delta):
+                try:
+                    with transaction.atomic(using=using):
+                        self.using(using).create(count=delta, **facets)
+                except IntegrityError:
+                    # Created by a concurrent update in the meantime
+                    queryset.update(count=F('count') + delta)
+
+    def rebuild(self):
+        """
+        Counts all the products again, with one GROUP BY query
+        """
+        using = self._db or router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            self.using(using).delete()
+            self.using(using).bulk_create([
+                ProductFacetCount(count=count, **dict(zip(self.FACETS, key)))
+                for key, count in Product.objects.using(using).get_facet_counts().items()])
+
+    def get_counts(self, category=None, price_band=None, rating=None, in_stock=None):
+        """
+        Number of products for every value of every facet, among the products
+        matching the filters of the other facets. `rating` is a minimum rating.
+
+        Reads the whole table, which has one row per combination of facet
+        values in use, whatever the number of products.
+        """
+        filters = {'category': category, 'price_band': price_band, 'rating': rating,
+                   'in_stock': in_stock}
+        counts = {facet: Counter() for facet in self.FACETS}
+
+        def matches(cell, facet):
+            value = filters[facet]
+            if value is None:
+                return True
+            if facet == 'rating':
+                return cell.rating >= value
+            return getattr(cell, facet) == value
+
+        for cell in self.filter(count__gt=0):
+            for facet in self.FACETS:
+                if not all(matches(cell, other) for other in self.FACETS if other != facet):
+                    continue
+                if facet == 'rating':
+                    # Products with at least this rating
+                    for rating_value in range(1, cell.rating + 1):
+                        counts['rating'][rating_value] += cell.count
+                else:
+                    counts[facet][getattr(cell, facet)] += cell.count
+        return counts
+
+
+class ProductFacetCount(models.Model):
+    """
+    Number of products in every combination of the values of the catalog
+    filters, kept up to date by ProductQuerySet and the Product signals
+    (see ecommerce.signals) so that the counts shown next to the filters
+    do not need a GROUP BY over Product
+    """
+    # pk of the ProductCategory, 0 for products without category
+    category = models.IntegerField()
+    price_band = models.SmallIntegerField()
+    # 0 for products without rating
+    rating = models.SmallIntegerField()
+    in_stock = models.BooleanField()
+    count = models.IntegerField(default=0)
+
+    objects = ProductFacetCountQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('category', 'price_band', 'rating', 'in_stock')
+
+    def __str__(self):
+        return "{0}, {1}, {2}, {3}: {4}".format(
+            self.category, self.price_band, self.rating, self.in_stock, self.count)
+
+
+class ProductSearchTerm(models.Model):
+    """
+    Word of the name or description of a product, for the portable search
+    index used when the database has no full-text search (see ecommerce.search)
+    """
+    term = models.CharField(max_length=100)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('term', 'product')
+
+    def __str__(self):
+        return "{0}, {1}".format(self.term, self.product)
+
+
 class Image(models.Model):
     """
     Image associated with a product
@@ -82,6 +431,104 @@ class Image(models.Model):
         return "{0} - {1}".format(self.product.name, self.name)
 
 
+Banner = namedtuple('Banner', [
+    'pk', 'name', 'image_path', 'product_pk', 'product_name', 'product_description'])
+
+
+def get_banner_list(limit=3):
+    """
+    Banner images for the home page carousel with their product details, in one query
+    """
+    images = Image.objects.filter(image_type=Image.BANNER_IMAGE).order_by('-name').values_list(
+        'pk', 'name', 'image_path', 'product_id', 'product__name', 'product__description')
+    return [Banner(*image) for image in images[:limit]]
+
+
+CartSummary = namedtuple('CartSummary', ['count', 'subtotal', 'total'])
+
+
+class CartQuerySet(models.QuerySet):
+
+    def add_product(self, user, product_id):
+        """
+        Adds one unit of the product to the user's cart, capped at the stock
+        available. Takes one statement when the product is already in the
+        cart and two when it is not.
+
+        Returns False when the product is out of stock, raises
+        Product.DoesNotExist when there is no such product.
+        """
+        updated = self.filter(
+            user=user, product_id=product_id, product__quantity__gt=F('quantity')
+        ).update(quantity=F('quantity') + 1)
+        if updated:
+            return True
+
+        # Insert the item unless it is in the cart already or out of stock
+        connection = connections[router.db_for_write(Cart)]
+        quote_name = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO {cart} ({user}, {product}, {quantity}) "
+                "SELECT %s, {id}, 1 FROM {product_table} "
+                "WHERE {id} = %s AND {quantity} > 0 AND NOT EXISTS ("
+                "SELECT 1 FROM {cart} WHERE {user} = %s AND {product} = %s)".format(
+                    cart=quote_name(Cart._meta.db_table),
+                    product_table=quote_name(Product._meta.db_table),
+                    user=quote_name('user_id'),
+                    product=quote_name('product_id'),
+                    quantity=quote_name('quantity'),
+                    id=quote_name('id')),
+                [user.pk, product_id, user.pk, product_id])
+            if cursor.rowcount:
+                return True
+
+        if not Product.objects.filter(pk=product_id).exists():
+            raise Product.DoesNotExist("Product matching query does not exist.")
+        return False
+
+    def summary(self):
+        """
+        Item count, subtotal and total after discounts of the cart items, in
+        one aggregate query with the discount computed by the database
+        """
+        price = F('product__price')
+        discount_price = price - Floor(price * F('product__discount_percent') / Value(100.0))
+        summary = self.aggregate(
+            count=Sum('quantity'),
+            subtotal=Sum(ExpressionWrapper(F('quantity') * price, output_field=FloatField())),
+            total=Sum(ExpressionWrapper(
+                F('quantity') * discount_price, output_field=FloatField())))
+        return CartSummary(
+            summary['count'] or 0, summary['subtotal'] or 0, summary['total'] or 0)
+
+    def merge_quantities(self, user, quantities):
+        """
+        Adds `quantities`, a {product pk: quantity} dict, to the user's cart
+        with one query per step whatever the number of products, capping
+        every item at the stock available
+        """
+        stock = dict(Product.objects.filter(
+            pk__in=list(quantities), quantity__gt=0).values_list('pk', 'quantity'))
+        existing = {item.product_id: item for item in self.filter(
+            user=user, product_id__in=list(stock))}
+
+        new_items = []
+        for product_id, available in stock.items():
+            item = existing.get(product_id)
+            if item is None:
+                new_items.append(Cart(
+                    user=user, product_id=product_id,
+                    quantity=min(quantities[product_id], available)))
+            else:
+                item.quantity = min(item.quantity + quantities[product_id], available)
+
+        if new_items:
+            self.bulk_create(new_items)
+        if existing:
+            self.bulk_update(list(existing.values()), ['quantity'])
+
+
 class Cart(models.Model):
     """
     Shopping cart for users to add products
@@ -90,10 +537,25 @@ class Cart(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=0)
 
+    objects = CartQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('user', 'product')
+
     def __str__(self):
         return "{0} - {1}".format(self.user.username, self.product.name)
 
 
+class OrderQuerySet(models.QuerySet):
+    def with_item_totals(self):
+        """
+        Annotates the number of lines (`items_count`) and of units
+        (`items_quantity`) of every order in the same query
+        """
+        return self.annotate(
+            items_count=Count('orderlist'), items_quantity=Sum('orderlist__quantity'))
+
+
 class Order(models.Model):
     """
     Used to store the order when user checkouts
@@ -102,13 +564,31 @@ class Order(models.Model):
     date = models.DateTimeField(auto_now=False, auto_now_add=True)
     amount = models.FloatField(default=0)
 
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date']),
+        ]
+
     @property
     def order_list(self):
-        return self.orderlist_set.all().order_by('product')
+        # Use the lines prefetched by OrderDetailView when available
+        if hasattr(self, 'prefetched_order_list'):
+            return self.prefetched_order_list
+        return self.orderlist_set.all().order_by('product_id')
+
+    @staticmethod
+    def order_list_prefetch():
+        return models.Prefetch(
+            'orderlist_set', queryset=OrderList.objects.order_by('product_id'),
+            to_attr='prefetched_order_list')
 
     @property
     def order_list_count(self):
-        return len(self.order_list)
+        if hasattr(self, 'items_count'):
+            return self.items_count
+        return self.orderlist_set.count()
 
     def __str__(self):
         return "{0} - {0}".format(self.user.username, self.date)
@@ -122,5 +602,30 @@ class OrderList(models.Model):
     product = models.ForeignKey(Product, on_delete=models.DO_NOTHING)
     quantity = models.IntegerField(default=1)
 
+    # Copied from the product when the order is placed, so that the order
+    # keeps showing what was paid and is rendered without reading Product.
+    # unit_price is null for lines not filled by backfill_order_lines yet.
+    product_name = models.CharField(max_length=200, blank=True, default="")
+    unit_price = models.FloatField(blank=True, null=True)
+    discount_percent = models.FloatField(default=0.0)
+    image_path = models.CharField(max_length=100, blank=True, default="")
+
+    SNAPSHOT_FIELDS = ['product_name', 'unit_price', 'discount_percent', 'image_path']
+
     def __str__(self):
         return "{0}, {1}".format(self.order, self.product)
+
+    def snapshot_product(self, product):
+        """
+        Copies the name, price, discount and featured image of the product
+        """
+        self.product_name = product.name
+        self.unit_price = product.price
+        self.discount_percent = product.discount_percent
+        self.image_path = product.featured_image or ""
+
+    @property
+    def discount_price(self):
+        if self.unit_price is None:
+            return None
+        return self.unit_price - int((self.unit_price * (self.discount_percent / 100)))
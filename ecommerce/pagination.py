@@ -0,0 +1,167 @@
+import base64
+import datetime
+import decimal
+import json
+import math
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import models
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a cursor taken from the url cannot be decoded
+    """
+
+
+def _json_default(value):
+    # Keep the full precision of the value, a rounded cursor can skip rows
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError("{0!r} cannot be used in a cursor".format(value))
+
+
+def encode_cursor(values):
+    data = json.dumps(list(values), default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, length):
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(data.decode())
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(values, list) or len(values) != length:
+        raise InvalidCursor("Invalid cursor")
+    for value in values:
+        # Only the scalars encode_cursor writes, e.g. no nested lists or 1e400
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise InvalidCursor("Invalid cursor")
+        if isinstance(value, float) and not math.isfinite(value):
+            raise InvalidCursor("Invalid cursor")
+    return values
+
+
+class KeysetPage:
+    """
+    A single page of results returned by KeysetPaginator
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginates a queryset by seeking past the last row of the previous page
+    instead of using OFFSET, so every page costs the same as the first one
+    and no COUNT(*) is needed.
+
+    The fields in `ordering` must not be null and the last one must be
+    unique (usually 'pk'), so that the ordering is stable.
+    """
+
+    def __init__(self, queryset, ordering=('pk',), per_page=20):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [(field.lstrip('-'), field.startswith('-')) for field in self.ordering]
+
+    def get_cursor(self, obj):
+        return encode_cursor(getattr(obj, name) for name, _ in self.fields)
+
+    def _check_types(self, values):
+        """
+        Integer fields only accept integers, filtering an id by 1.5 would
+        silently match the wrong rows, and decimal fields only finite numbers
+        """
+        opts = self.queryset.model._meta
+        for (name, _), value in zip(self.fields, values):
+            try:
+                field = opts.pk if name == 'pk' else opts.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if isinstance(field, models.IntegerField) and not isinstance(value, int):
+                raise InvalidCursor("Invalid cursor")
+            if isinstance(field, models.DecimalField):
+                try:
+                    if not decimal.Decimal(str(value)).is_finite():
+                        raise InvalidCursor("Invalid cursor")
+                except decimal.InvalidOperation:
+                    raise InvalidCursor("Invalid cursor")
+
+    def _seek(self, values, backwards):
+        """
+        Builds the filter for rows that come after (or before) `values`,
+        e.g. for ordering (a, b): a > x OR (a = x AND b > y)
+        """
+        condition = Q()
+        for i, (name, descending) in enumerate(self.fields):
+            lookup = 'lt' if descending != backwards else 'gt'
+            term = Q(**{'{0}__{1}'.format(name, lookup): values[i]})
+            for j, (previous_name, _) in enumerate(self.fields[:i]):
+                term &= Q(**{previous_name: values[j]})
+            condition |= term
+        return condition
+
+    def page(self, after=None, before=None):
+        """
+        Returns the page after the `after` cursor, before the `before` cursor,
+        or the first page when no cursor is given
+        """
+        backwards = before is not None
+        cursor = before if backwards else after
+        queryset = self.queryset
+
+        if cursor is not None:
+            values = decode_cursor(cursor, len(self.fields))
+            self._check_types(values)
+            try:
+                queryset = queryset.filter(self._seek(values, backwards))
+            except (ValueError, TypeError, ValidationError):
+                raise InvalidCursor("Invalid cursor")
+
+        ordering = self.ordering
+        if backwards:
+            ordering = [field[1:] if field.startswith('-') else '-' + field for field in ordering]
+
+        try:
+            object_list = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        except OverflowError:
+            # A cursor value too large for the database column
+            raise InvalidCursor("Invalid cursor")
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+
+        if backwards:
+            object_list.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, cursor is not None
+
+        next_cursor = previous_cursor = None
+        if has_next:
+            next_cursor = self.get_cursor(object_list[-1]) if object_list else before
+        if has_previous:
+            previous_cursor = self.get_cursor(object_list[0]) if object_list else after
+        return KeysetPage(object_list, next_cursor, previous_cursor)
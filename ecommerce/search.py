@@ -0,0 +1,250 @@
+import re
+from collections import Counter
+
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models import Count, Q, Sum
+from django.utils.html import strip_tags
+
+from ecommerce.models import Product, ProductSearchTerm
+from ecommerce.pagination import KeysetPage, InvalidCursor, encode_cursor, decode_cursor
+
+# Matches of a term in the name count this many times more than in the description
+NAME_WEIGHT = 3
+
+MAX_QUERY_TERMS = 10
+
+
+def tokenize(text):
+    """
+    Lowercase words of the text, HTML tags of descriptions are left out
+    """
+    return re.findall(r'\w+', strip_tags(text or '').lower())
+
+
+class BaseSearchIndex:
+    """
+    Index of the name and description of the products.
+
+    search() returns (rank, product pk) pairs of the products matching every
+    term, best match first. A lower rank is a better match.
+    """
+
+    def __init__(self, using):
+        self.using = using
+
+    def index(self, products):
+        raise NotImplementedError
+
+    def remove(self, pks):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def search(self, terms, after=None, before=None, limit=20):
+        """
+        Ranked matches after (or before) the (rank, pk) pair of a previous page
+        """
+        raise NotImplementedError
+
+    def rebuild(self, batch_size=1000):
+        """
+        Indexes all the products again, in pk-ordered batches
+        """
+        self.clear()
+        queryset = Product.objects.using(self.using).only('pk', 'name', 'description')
+        last_pk = 0
+        while True:
+            products = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not products:
+                break
+            with transaction.atomic(using=self.using):
+                self.index(products)
+            last_pk = products[-1].pk
+            yield len(products)
+
+
+class FTS5SearchIndex(BaseSearchIndex):
+    """
+    SQLite FTS5 table with the product pk as rowid, ranked by bm25
+    """
+    table = 'ecommerce_product_fts'
+
+    def create_table(self):
+        """
+        Creates the table, returns False when it already exists
+        """
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [self.table])
+            if cursor.fetchone():
+                return False
+            cursor.execute(
+                "CREATE VIRTUAL TABLE {0} USING fts5("
+                "name, description, tokenize = 'unicode61 remove_diacritics 2')".format(
+                    self.table))
+        return True
+
+    def index(self, products):
+        products = list(products)
+        with connections[self.using].cursor() as cursor:
+            self._delete(cursor, [product.pk for product in products])
+            cursor.executemany(
+                "INSERT INTO {0} (rowid, name, description) VALUES (%s, %s, %s)".format(
+                    self.table),
+                [(product.pk, product.name, strip_tags(product.description or ''))
+                 for product in products])
+
+    def _delete(self, cursor, pks):
+        cursor.executemany(
+            "DELETE FROM {0} WHERE rowid = %s".format(self.table), [(pk,) for pk in pks])
+
+    def remove(self, pks):
+        with connections[self.using].cursor() as cursor:
+            self._delete(cursor, pks)
+
+    def clear(self):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute("DELETE FROM {0}".format(self.table))
+
+    def search(self, terms, after=None, before=None, limit=20):
+        # Terms are \w+ words, quoting them keeps FTS5 operators out of the query
+        query = ' AND '.join('"{0}"'.format(term) for term in terms)
+        params = [NAME_WEIGHT, query]
+        sql = (
+            "SELECT score, product_id FROM ("
+            "SELECT rowid AS product_id, bm25({0}, %s, 1.0) AS score "
+            "FROM {0} WHERE {0} MATCH %s)".format(self.table))
+        cursor_values = before if before is not None else after
+        if cursor_values is not None:
+            lookup = '<' if before is not None else '>'
+            sql += " WHERE score {0} %s OR (score = %s AND product_id {0} %s)".format(lookup)
+            params += [cursor_values[0], cursor_values[0], cursor_values[1]]
+        direction = 'DESC' if before is not None else 'ASC'
+        sql += " ORDER BY score {0}, product_id {0} LIMIT %s".format(direction)
+        params.append(limit)
+
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(sql, params)
+            return [tuple(row) for row in cursor.fetchall()]
+
+
+class InvertedSearchIndex(BaseSearchIndex):
+    """
+    Portable index on the ProductSearchTerm table, one row per word and
+    product, ranked by the weighted number of occurrences of the terms
+    """
+
+    def get_terms(self, product):
+        weights = Counter()
+        for term in tokenize(product.name):
+            weights[term] += NAME_WEIGHT
+        for term in tokenize(product.description):
+            weights[term] += 1
+        max_length = ProductSearchTerm._meta.get_field('term').max_length
+        return [
+            ProductSearchTerm(term=term, product_id=product.pk, weight=weight)
+            for term, weight in weights.items() if len(term) <= max_length]
+
+    def index(self, products):
+        products = list(products)
+        self.remove([product.pk for product in products])
+        ProductSearchTerm.objects.using(self.using).bulk_create(
+            [search_term for product in products for search_term in self.get_terms(product)])
+
+    def remove(self, pks):
+        ProductSearchTerm.objects.using(self.using).filter(product__in=pks).delete()
+
+    def clear(self):
+        ProductSearchTerm.objects.using(self.using).all().delete()
+
+    def search(self, terms, after=None, before=None, limit=20):
+        # Rank is the negated score, so that lower is better like bm25
+        matches = ProductSearchTerm.objects.using(self.using).filter(
+            term__in=terms).values('product').annotate(
+            rank=-Sum('weight'), matched=Count('term')).filter(matched=len(terms))
+        cursor_values = before if before is not None else after
+        if cursor_values is not None:
+            lookup = 'lt' if before is not None else 'gt'
+            matches = matches.filter(
+                Q(**{'rank__' + lookup: cursor_values[0]})
+                | Q(rank=cursor_values[0], **{'product__' + lookup: cursor_values[1]}))
+        ordering = ('-rank', '-product') if before is not None else ('rank', 'product')
+        return [(match['rank'], match['product'])
+                for match in matches.order_by(*ordering)[:limit]]
+
+
+def has_fts5(using):
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    if not hasattr(connection, '_ecommerce_has_fts5'):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA compile_options")
+            connection._ecommerce_has_fts5 = any(
+                option == 'ENABLE_FTS5' for option, in cursor.fetchall())
+    return connection._ecommerce_has_fts5
+
+
+def get_search_index(using=None):
+    """
+    FTS5 index on SQLite builds that have it, the portable index otherwise
+    """
+    if using is None:
+        using = router.db_for_write(Product)
+    if has_fts5(using):
+        return FTS5SearchIndex(using)
+    return InvertedSearchIndex(using)
+
+
+def create_search_table(using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    post_migrate handler creating the FTS5 table, which migrations cannot
+    describe, and indexing the products already in the database
+    """
+    search_index = get_search_index(using)
+    if isinstance(search_index, FTS5SearchIndex) and search_index.create_table():
+        for _ in search_index.rebuild():
+            pass
+
+
+def search_products(query, after=None, before=None, per_page=20):
+    """
+    KeysetPage of the products matching every word of `query`, best match
+    first, with their featured image
+    """
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return KeysetPage([])
+
+    cursor = before if before is not None else after
+    cursor_values = None
+    if cursor is not None:
+        cursor_values = decode_cursor(cursor, 2)
+        if not isinstance(cursor_values[1], int) or isinstance(cursor_values[0], str):
+            raise InvalidCursor("Invalid cursor")
+        if before is not None:
+            before, after = cursor_values, None
+        else:
+            after = cursor_values
+
+    search_index = get_search_index(router.db_for_read(Product))
+    matches = search_index.search(terms, after=after, before=before, limit=per_page + 1)
+    has_more = len(matches) > per_page
+    matches = matches[:per_page]
+    if before is not None:
+        matches.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, cursor is not None
+
+    products = Product.objects.with_featured_image().in_bulk([pk for _, pk in matches])
+    # Products deleted since they were indexed are left out
+    object_list = [products[pk] for _, pk in matches if pk in products]
+
+    next_cursor = previous_cursor = None
+    if has_next:
+        next_cursor = encode_cursor(matches[-1]) if matches else cursor
+    if has_previous:
+        previous_cursor = encode_cursor(matches[0]) if matches else cursor
+    return KeysetPage(object_list, next_cursor, previous_cursor)
@@ -0,0 +1,111 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from ecommerce.cache import (
+    category_list_cache, banner_list_cache, catalog_page_cache, cart_summary_cache)
+from ecommerce.carts import merge_anonymous_cart
+from ecommerce.images import schedule_derivatives
+from ecommerce.models import (
+    ProductCategory, Product, Image, ProductFacetCount, FACET_ATTNAMES, FACET_FIELDS,
+    get_facet_deltas)
+from ecommerce.search import get_search_index
+
+
+@receiver([post_save, post_delete], sender=ProductCategory)
+def invalidate_category_list(sender, **kwargs):
+    category_list_cache.invalidate()
+
+
+@receiver([post_save, post_delete], sender=Image)
+def invalidate_banner_list_on_image_change(sender, instance, **kwargs):
+    if instance.image_type == Image.BANNER_IMAGE:
+        banner_list_cache.invalidate()
+        return
+    # An image that was a banner until now. Only the cached list matters,
+    # building it here would add a query to every image save.
+    banner_list = banner_list_cache.peek()
+    if banner_list is not None and instance.pk in [banner.pk for banner in banner_list]:
+        banner_list_cache.invalidate()
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_banner_list_on_product_change(sender, instance, **kwargs):
+    banner_list = banner_list_cache.peek()
+    if banner_list is not None and instance.pk in [banner.product_pk for banner in banner_list]:
+        banner_list_cache.invalidate()
+
+
+@receiver([post_save, post_delete], sender=ProductCategory)
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Image)
+def invalidate_catalog_pages(sender, **kwargs):
+    catalog_page_cache.invalidate()
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_cart_summaries(sender, **kwargs):
+    # Prices of products in the carts may have changed
+    cart_summary_cache.invalidate()
+
+
+@receiver(post_save, sender=Image)
+def make_image_derivatives(sender, instance, using, update_fields=None, **kwargs):
+    if update_fields is not None and 'image_path' not in update_fields:
+        return
+    image_path = str(instance.image_path)
+    # The file of a new upload is only certain to stay once the row is committed
+    transaction.on_commit(lambda: schedule_derivatives([image_path]), using=using)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, using, update_fields=None, **kwargs):
+    if update_fields is not None and not {'name', 'description'} & set(update_fields):
+        return
+    get_search_index(using).index([instance])
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_index(sender, instance, using, **kwargs):
+    get_search_index(using).remove([instance.pk])
+
+
+def changes_facets(update_fields):
+    return update_fields is None or bool(FACET_FIELDS & set(update_fields))
+
+
+@receiver(pre_save, sender=Product)
+def load_facet_key(sender, instance, using, update_fields=None, **kwargs):
+    # Products loaded without the facet fields, e.g. with only()
+    if (not instance._state.adding and changes_facets(update_fields)
+            and not hasattr(instance, '_loaded_facet_key')):
+        loaded = Product.objects.using(using).only(*FACET_ATTNAMES).filter(
+            pk=instance.pk).first()
+        if loaded is not None:
+            instance._loaded_facet_key = loaded._loaded_facet_key
+
+
+@receiver(post_save, sender=Product)
+def update_facet_counts_on_save(sender, instance, created, using, update_fields=None,
+                                **kwargs):
+    if not changes_facets(update_fields):
+        return
+    before = {}
+    if not created and hasattr(instance, '_loaded_facet_key'):
+        before = {instance._loaded_facet_key: 1}
+    facet_key = instance.get_facet_key()
+    ProductFacetCount.objects.using(using).add(get_facet_deltas(before, {facet_key: 1}))
+    instance._loaded_facet_key = facet_key
+
+
+@receiver(post_delete, sender=Product)
+def update_facet_counts_on_delete(sender, instance, using, **kwargs):
+    facet_key = getattr(instance, '_loaded_facet_key', instance.get_facet_key())
+    ProductFacetCount.objects.using(using).add({facet_key: -1})
+
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    if request is not None:
+        merge_anonymous_cart(request, user)
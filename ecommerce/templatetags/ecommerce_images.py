@@ -0,0 +1,30 @@
+from django import template
+from django.conf import settings
+
+from ecommerce.images import get_derivatives
+
+register = template.Library()
+
+
+def get_srcset(paths):
+    return ', '.join(
+        '{0}{1} {2}w'.format(settings.MEDIA_URL, path, width) for width, path in paths)
+
+
+@register.inclusion_tag('ecommerce/picture.html.haml')
+def picture(image_path, sizes, css_class='', height=''):
+    """
+    <picture> of a product image offering its WebP and resized copies, so
+    that the browser downloads the smallest one covering `sizes`.
+    The original is used until the copies are made.
+    """
+    derivatives = get_derivatives(settings.MEDIA_ROOT, image_path) if image_path else []
+    return {
+        'src': '{0}{1}'.format(settings.MEDIA_URL, derivatives[0][1] if derivatives else (
+            image_path or '')),
+        'srcset': get_srcset([(width, path) for width, path, _ in derivatives]),
+        'webp_srcset': get_srcset([(width, webp_path) for width, _, webp_path in derivatives]),
+        'sizes': sizes,
+        'css_class': css_class,
+        'height': height,
+    }
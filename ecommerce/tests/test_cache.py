@@ -0,0 +1,209 @@
+import re
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ecommerce.cache import VersionedCache, banner_list_cache, catalog_page_cache
+from ecommerce.context_processors import category_list
+from ecommerce.models import ProductCategory, Product, Image, get_banner_list
+from ecommerce.views import CSRF_TOKEN_PLACEHOLDER
+from registration.models import User
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestVersionedCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.versioned_cache = VersionedCache('test')
+        self.build_count = 0
+
+    def build(self):
+        self.build_count += 1
+        return self.build_count
+
+    def test_value_is_built_once(self):
+        self.assertEqual(1, self.versioned_cache.get_or_build(self.build))
+        self.assertEqual(1, self.versioned_cache.get_or_build(self.build))
+        self.assertEqual(1, self.build_count)
+
+    def test_invalidate_rebuilds_value(self):
+        self.versioned_cache.get_or_build(self.build)
+        self.versioned_cache.invalidate()
+        self.assertEqual(2, self.versioned_cache.get_or_build(self.build))
+
+    def test_shared_tier_is_used_by_other_processes(self):
+        self.versioned_cache.get_or_build(self.build)
+        other_process_cache = VersionedCache('test')
+        self.assertEqual(1, other_process_cache.get_or_build(self.build))
+        self.assertEqual(1, self.build_count)
+
+    def test_invalidate_from_other_process(self):
+        self.versioned_cache.get_or_build(self.build)
+        VersionedCache('test').invalidate()
+        self.assertEqual(2, self.versioned_cache.get_or_build(self.build))
+
+    def test_peek_does_not_build(self):
+        self.assertIsNone(self.versioned_cache.peek())
+        self.versioned_cache.get_or_build(self.build)
+        self.assertEqual(1, self.versioned_cache.peek())
+        self.assertEqual(1, self.build_count)
+
+    def test_keys_are_cached_separately(self):
+        self.assertEqual(1, self.versioned_cache.get_or_build(self.build, key='a'))
+        self.assertEqual(2, self.versioned_cache.get_or_build(self.build, key='b'))
+        self.assertEqual(1, self.versioned_cache.get_or_build(self.build, key='a'))
+
+    def test_versions_and_values_expire(self):
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            self.versioned_cache.get_or_build(self.build)
+            self.versioned_cache.invalidate()
+        for call in cache_set.call_args_list:
+            self.assertEqual(300, call[0][2])
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+    def test_dummy_cache_always_builds(self):
+        self.versioned_cache.get_or_build(self.build)
+        self.versioned_cache.get_or_build(self.build)
+        self.assertEqual(2, self.build_count)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestCategoryListContextProcessor(TestCase):
+    def setUp(self):
+        cache.clear()
+        ProductCategory.objects.create(name="Category 1")
+
+    def test_cached_category_list_makes_no_queries(self):
+        category_list(None)
+        with self.assertNumQueries(0):
+            categories = category_list(None)['category_list']
+        self.assertEqual(["Category 1"], [category.name for category in categories])
+
+    def test_new_category_invalidates_cache(self):
+        category_list(None)
+        ProductCategory.objects.create(name="Category 2")
+        categories = category_list(None)['category_list']
+        self.assertEqual(2, len(categories))
+
+    def test_deleted_category_invalidates_cache(self):
+        category_list(None)
+        ProductCategory.objects.all().delete()
+        self.assertEqual([], category_list(None)['category_list'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestBannerListCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(
+            name="Product A", description="Description", price=10.0, quantity=1)
+        self.image = Image.objects.create(
+            product=self.product, name="banner", image_path="1.jpg",
+            image_type=Image.BANNER_IMAGE)
+
+    def get_banner_list(self):
+        return banner_list_cache.get_or_build(get_banner_list)
+
+    def test_banner_list_has_product_details(self):
+        banner = self.get_banner_list()[0]
+        self.assertEqual(self.image.pk, banner.pk)
+        self.assertEqual("Product A", banner.product_name)
+        self.assertEqual("Description", banner.product_description)
+        self.assertEqual(self.product.pk, banner.product_pk)
+
+    def test_cached_banner_list_makes_no_queries(self):
+        self.get_banner_list()
+        with self.assertNumQueries(0):
+            self.get_banner_list()
+
+    def test_product_change_invalidates_banner_list(self):
+        self.get_banner_list()
+        self.product.name = "Product B"
+        self.product.save()
+        self.assertEqual("Product B", self.get_banner_list()[0].product_name)
+
+    def test_image_no_longer_banner_invalidates_banner_list(self):
+        self.get_banner_list()
+        self.image.image_type = Image.FEATURED_IMAGE
+        self.image.save()
+        self.assertEqual([], self.get_banner_list())
+
+    def test_saves_do_not_build_banner_list(self):
+        # Only the price, so that the search index is not updated either
+        with self.assertNumQueries(1):
+            self.product.save(update_fields=['price'])
+        with self.assertNumQueries(1):
+            Image.objects.create(product=self.product, name="image", image_path="2.jpg")
+
+    def test_other_product_change_keeps_banner_list(self):
+        self.get_banner_list()
+        Product.objects.create(name="Product C", price=10.0, quantity=1)
+        with self.assertNumQueries(0):
+            self.get_banner_list()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestCatalogPageCache(TestCase):
+    url = reverse('home')
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(
+            name="Product A", price=100.0, discount_percent=15, quantity=3, rating=4)
+
+    def test_anonymous_page_is_served_from_cache(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Product A')
+
+    def test_cache_is_keyed_by_query(self):
+        category = ProductCategory.objects.create(name="Category1")
+        self.client.get(self.url)
+        response = self.client.get(self.url, {'category': category.name})
+        self.assertNotContains(response, 'Product A')
+
+    def test_other_query_parameters_use_same_page(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url, {'utm_source': 'mail', 'x': '123'})
+
+    def test_page_cache_timeout(self):
+        self.assertEqual(60, catalog_page_cache.timeout)
+
+    def test_product_change_invalidates_page(self):
+        self.client.get(self.url)
+        self.product.name = "Product B"
+        self.product.save()
+        self.assertContains(self.client.get(self.url), 'Product B')
+
+    def test_out_of_stock_invalidates_page(self):
+        self.client.get(self.url)
+        self.product.reduce_quantity(3)
+        self.assertContains(self.client.get(self.url), 'Out of Stock')
+
+    def test_cached_page_has_csrf_token_of_visitor(self):
+        self.client.get(self.url)
+
+        client = Client(enforce_csrf_checks=True)
+        response = client.get(self.url)
+        self.assertNotContains(response, CSRF_TOKEN_PLACEHOLDER)
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode())
+        response = client.post(reverse('add_to_cart'), {
+            'product': self.product.pk, 'csrfmiddlewaretoken': token.group(1)})
+        self.assertNotEqual(403, response.status_code)
+
+    def test_authenticated_users_are_not_served_from_cache(self):
+        self.client.get(self.url)
+        User.objects.create_user(username="user", password="password")
+        self.client.login(username="user", password="password")
+        self.assertContains(self.client.get(self.url), 'Logout')
@@ -0,0 +1,157 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+
+from ecommerce.carts import SignedCookieCartStorage, CacheCartStorage, DatabaseCartStorage
+from ecommerce.models import Product, Cart, CartSummary
+from ecommerce.views import get_total_price_of_cart
+from registration.models import User
+
+
+class CartStorageTestMixin:
+    storage_class = None
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.p1 = Product.objects.create(name="Product A", price=100.0, quantity=2)
+        self.p2 = Product.objects.create(name="Product B", price=50.0, quantity=5)
+
+    def get_storage(self, cookies=None):
+        request = self.factory.get('/')
+        request.user = AnonymousUser()
+        request.COOKIES.update(cookies or {})
+        return self.storage_class(request)
+
+    def save(self, storage):
+        response = HttpResponse()
+        storage.update(response)
+        return {name: morsel.value for name, morsel in response.cookies.items()}
+
+    def test_items_are_kept_between_requests(self):
+        storage = self.get_storage()
+        storage.add(self.p1.pk)
+        storage.add(self.p2.pk)
+        storage.add(self.p1.pk)
+
+        items = self.get_storage(self.save(storage)).get_items()
+        self.assertEqual(
+            [(self.p1, 2), (self.p2, 1)], [(item.product, item.quantity) for item in items])
+
+    def test_add_is_capped_at_stock(self):
+        storage = self.get_storage()
+        self.assertTrue(storage.add(self.p1.pk))
+        self.assertTrue(storage.add(self.p1.pk))
+        self.assertFalse(storage.add(self.p1.pk))
+
+    def test_add_unknown_product(self):
+        with self.assertRaises(Product.DoesNotExist):
+            self.get_storage().add(1000)
+
+    def test_remove(self):
+        storage = self.get_storage()
+        storage.add(self.p1.pk)
+        self.assertTrue(storage.remove(self.p1.pk))
+        self.assertFalse(storage.remove(self.p1.pk))
+        self.assertEqual([], self.get_storage(self.save(storage)).get_items())
+
+    def test_cart_does_not_write_to_database(self):
+        storage = self.get_storage()
+        storage.add(self.p1.pk)
+        self.save(storage)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_summary(self):
+        storage = self.get_storage()
+        storage.add(self.p1.pk)
+        storage.add(self.p2.pk)
+        self.assertEqual(CartSummary(2, 150.0, 150.0), storage.get_summary())
+
+
+class TestSignedCookieCartStorage(CartStorageTestMixin, TestCase):
+    storage_class = SignedCookieCartStorage
+
+    def test_tampered_cookie_is_ignored(self):
+        self.assertEqual([], self.get_storage({'cart': '{"1": 100}'}).get_items())
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TestCacheCartStorage(CartStorageTestMixin, TestCase):
+    storage_class = CacheCartStorage
+
+    def setUp(self):
+        super(TestCacheCartStorage, self).setUp()
+        cache.clear()
+
+    def test_cookie_only_has_cart_id(self):
+        storage = self.get_storage()
+        storage.add(self.p1.pk)
+        cookies = self.save(storage)
+        self.assertEqual(['cart_id'], list(cookies))
+        self.assertNotIn('Product', cookies['cart_id'])
+
+
+class TestMergeQuantities(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="name", password="password")
+        self.p1 = Product.objects.create(name="Product A", price=100.0, quantity=3)
+        self.p2 = Product.objects.create(name="Product B", price=50.0, quantity=5)
+        self.p3 = Product.objects.create(name="Product C", price=50.0, quantity=0)
+        Cart.objects.create(user=self.user, product=self.p1, quantity=2)
+
+    def test_merge_quantities(self):
+        Cart.objects.merge_quantities(self.user, {self.p1.pk: 2, self.p2.pk: 1, self.p3.pk: 1})
+
+        request = RequestFactory().get('/')
+        request.user = self.user
+        items = DatabaseCartStorage(request).get_items()
+        self.assertEqual(
+            [(self.p1, 3), (self.p2, 1)], [(item.product, item.quantity) for item in items])
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TestDatabaseCartSummary(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="name", password="password")
+        self.p1 = Product.objects.create(
+            name="Product A", price=199.0, discount_percent=15, quantity=5)
+        self.p2 = Product.objects.create(name="Product B", price=50.0, quantity=5)
+        Cart.objects.create(user=self.user, product=self.p1, quantity=3)
+        Cart.objects.create(user=self.user, product=self.p2, quantity=1)
+        request = RequestFactory().get('/')
+        request.user = self.user
+        self.storage = DatabaseCartStorage(request)
+
+    def test_summary_matches_items(self):
+        summary = self.storage.get_summary()
+        self.assertEqual(4, summary.count)
+        self.assertEqual(3 * 199.0 + 50.0, summary.subtotal)
+        self.assertEqual(get_total_price_of_cart(self.storage.get_items()), summary.total)
+
+    def test_summary_of_empty_cart(self):
+        Cart.objects.all().delete()
+        self.assertEqual(CartSummary(0, 0, 0), self.storage.get_summary())
+
+    def test_summary_is_one_query_then_cached(self):
+        with self.assertNumQueries(1):
+            self.storage.get_summary()
+        with self.assertNumQueries(0):
+            self.storage.get_summary()
+
+    def test_cart_change_updates_summary(self):
+        self.storage.get_summary()
+        self.storage.add(self.p2.pk)
+        self.assertEqual(5, self.storage.get_summary().count)
+        self.storage.remove(self.p1.pk)
+        self.assertEqual(2, self.storage.get_summary().count)
+        self.storage.clear()
+        self.assertEqual(0, self.storage.get_summary().count)
+
+    def test_price_change_updates_summary(self):
+        self.storage.get_summary()
+        self.p2.price = 60.0
+        self.p2.save()
+        self.assertEqual(3 * 199.0 + 60.0, self.storage.get_summary().subtotal)
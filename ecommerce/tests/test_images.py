@@ -0,0 +1,130 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from PIL import Image as PILImage
+
+from ecommerce.images import get_derivative_path, get_derivatives, make_derivatives
+from ecommerce.models import Product, Image
+
+
+class ImageTestCase(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.media_root = directory.name
+        os.makedirs(os.path.join(self.media_root, 'products'))
+        self.save_image('products/ball.jpg', (800, 600))
+
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def save_image(self, path, size, image_format='JPEG'):
+        PILImage.new('RGB', size, 'red').save(os.path.join(self.media_root, path), image_format)
+
+    def get_size(self, path):
+        with PILImage.open(os.path.join(self.media_root, path)) as image:
+            return image.format, image.size
+
+
+class TestMakeDerivatives(ImageTestCase):
+    def test_derivative_path(self):
+        self.assertEqual(
+            'products/derivatives/ball-250.jpg', get_derivative_path('products/ball.jpg', 250))
+        self.assertEqual(
+            'products/derivatives/ball-500.webp',
+            get_derivative_path('products/ball.jpg', 500, '.webp'))
+
+    def test_resized_and_webp_copies_are_made(self):
+        self.assertEqual(4, make_derivatives(self.media_root, 'products/ball.jpg'))
+
+        self.assertEqual(('JPEG', (250, 188)), self.get_size('products/derivatives/ball-250.jpg'))
+        self.assertEqual(('WEBP', (250, 188)), self.get_size('products/derivatives/ball-250.webp'))
+        self.assertEqual(('JPEG', (500, 375)), self.get_size('products/derivatives/ball-500.jpg'))
+        self.assertEqual(('WEBP', (500, 375)), self.get_size('products/derivatives/ball-500.webp'))
+        self.assertEqual([
+            (250, 'products/derivatives/ball-250.jpg', 'products/derivatives/ball-250.webp'),
+            (500, 'products/derivatives/ball-500.jpg', 'products/derivatives/ball-500.webp'),
+        ], get_derivatives(self.media_root, 'products/ball.jpg'))
+
+    def test_small_images_are_not_enlarged(self):
+        self.save_image('products/dot.png', (100, 50), 'PNG')
+        make_derivatives(self.media_root, 'products/dot.png')
+
+        self.assertEqual(('PNG', (100, 50)), self.get_size('products/derivatives/dot-500.png'))
+
+    def test_copies_newer_than_the_original_are_kept(self):
+        make_derivatives(self.media_root, 'products/ball.jpg')
+
+        self.assertEqual(0, make_derivatives(self.media_root, 'products/ball.jpg'))
+        self.assertEqual(4, make_derivatives(self.media_root, 'products/ball.jpg', force=True))
+
+    def test_missing_or_invalid_image(self):
+        with open(os.path.join(self.media_root, 'products/notes.txt'), 'w') as notes:
+            notes.write("not an image")
+
+        self.assertEqual(0, make_derivatives(self.media_root, 'products/missing.jpg'))
+        self.assertEqual(0, make_derivatives(self.media_root, 'products/notes.txt'))
+        self.assertEqual([], get_derivatives(self.media_root, 'products/notes.txt'))
+
+
+class TestImageSignal(ImageTestCase):
+    def test_copies_are_made_once_the_image_is_committed(self):
+        product = Product.objects.create(
+            name="Ball", price=100, discount_percent=0, quantity=1, rating=1)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Image.objects.create(product=product, name="ball", image_path='products/ball.jpg',
+                                 image_type=Image.FEATURED_IMAGE)
+        self.assertEqual([], get_derivatives(self.media_root, 'products/ball.jpg'))
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(2, len(get_derivatives(self.media_root, 'products/ball.jpg')))
+
+
+class TestPictureTag(ImageTestCase):
+    def render(self, image_path):
+        template = Template("{% load ecommerce_images %}{% picture image_path '250px' 'card' %}")
+        return template.render(Context({'image_path': image_path}))
+
+    def test_original_is_used_until_the_copies_are_made(self):
+        html = self.render('products/ball.jpg')
+
+        self.assertIn('src="/media/products/ball.jpg"', html)
+        self.assertNotIn('srcset', html)
+
+    def test_copies_are_offered(self):
+        make_derivatives(self.media_root, 'products/ball.jpg')
+        html = self.render('products/ball.jpg')
+
+        self.assertIn(
+            "srcset='/media/products/derivatives/ball-250.webp 250w, "
+            "/media/products/derivatives/ball-500.webp 500w'", html)
+        self.assertIn('src="/media/products/derivatives/ball-250.jpg"', html)
+        self.assertIn(
+            'srcset="/media/products/derivatives/ball-250.jpg 250w, '
+            '/media/products/derivatives/ball-500.jpg 500w"', html)
+        self.assertIn('sizes="250px"', html)
+
+
+class TestBuildImageDerivatives(ImageTestCase):
+    def build(self, **options):
+        stdout = StringIO()
+        call_command('build_image_derivatives', stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_copies_of_existing_images_are_made(self):
+        self.save_image('products/box.jpg', (300, 300))
+
+        self.assertIn("Done, 2 images, 8 copies written", self.build(workers=1))
+        self.assertEqual(2, len(get_derivatives(self.media_root, 'products/box.jpg')))
+        # The copies themselves are not resized again
+        self.assertIn("Done, 2 images, 0 copies written", self.build(workers=1))
+
+    def test_copies_are_made_in_processes(self):
+        self.assertIn("Done, 1 images, 4 copies written", self.build(workers=2, force=True))
@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from ecommerce.management.commands.import_products import Command
+from ecommerce.models import Product, ProductCategory
+
+
+class TestImportProducts(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.category = ProductCategory.objects.create(name="Fruits")
+        self.apple = Product.objects.create(name="Apple", price=10.0, quantity=1)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as feed:
+            feed.write(content)
+        return path
+
+    def import_products(self, path, **options):
+        stdout = StringIO()
+        call_command('import_products', path, stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_csv(self):
+        path = self.write('feed.csv', (
+            "name,description,price,discount_percent,rating,quantity,category\n"
+            "Apple,Red apple,20,10,4,5,Fruits\n"
+            "Carrot,,5,0,,100,Vegetables\n"
+            ",no name,1,0,0,1,\n"
+            "Pear,,not a price,0,0,1,Fruits\n"))
+
+        output = self.import_products(path, batch_size=2)
+
+        self.assertIn("1 products created, 1 updated, 2 rows skipped", output)
+        self.assertIn("rows/s", output)
+        self.apple.refresh_from_db()
+        self.assertEqual(
+            ("Red apple", 20.0, 4, 5, self.category),
+            (self.apple.description, self.apple.price, self.apple.rating, self.apple.quantity,
+             self.apple.category))
+        self.assertEqual(18, self.apple.effective_price)
+        carrot = Product.objects.get(name="Carrot")
+        self.assertEqual("Vegetables", carrot.category.name)
+        self.assertIsNone(carrot.rating)
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+    def test_jsonl(self):
+        path = self.write('feed.jsonl', "\n".join([
+            json.dumps({'name': 'Banana', 'price': 3, 'quantity': 7, 'category': 'Fruits'}),
+            '{"name": broken',
+            json.dumps({'name': 'Banana', 'price': 4}),
+        ]))
+
+        output = self.import_products(path)
+
+        self.assertIn("1 products created, 0 updated, 1 rows skipped", output)
+        banana = Product.objects.get(name="Banana")
+        self.assertEqual((4.0, 7, self.category), (banana.price, banana.quantity, banana.category))
+
+    def test_resume_after_interruption(self):
+        path = self.write('feed.jsonl', "\n".join(
+            json.dumps({'name': 'Product {0}'.format(i), 'price': i}) for i in range(5)))
+        import_batch = Command.import_batch
+        calls = []
+
+        def fail_on_second_batch(command, batch):
+            calls.append(batch)
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            return import_batch(command, batch)
+
+        with mock.patch.object(Command, 'import_batch', fail_on_second_batch):
+            with self.assertRaises(KeyboardInterrupt):
+                self.import_products(path, batch_size=2)
+        self.assertEqual(3, Product.objects.count())
+        with open(path + '.checkpoint') as checkpoint_file:
+            self.assertEqual(2, json.load(checkpoint_file)['rows'])
+
+        output = self.import_products(path, batch_size=2)
+        self.assertIn("Resuming after row 2", output)
+        self.assertIn("3 products created", output)
+        self.assertEqual(6, Product.objects.count())
+
+    def test_changed_file_is_not_resumed(self):
+        path = self.write('feed.csv', "name\nApple\n")
+        self.write('feed.csv.checkpoint', json.dumps({'size': 1, 'rows': 1}))
+        with self.assertRaises(Exception):
+            self.import_products(path)
+        self.import_products(path, restart=True)
@@ -1,6 +1,17 @@
-from django.test import TestCase
-
-from ecommerce.models import Product, Image, ProductCategory, Cart, Order, OrderList
+from decimal import Decimal
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.db.models import F
+from django.test import TestCase, override_settings
+
+from ecommerce.models import (
+    Product, Image, ProductCategory, Cart, Order, OrderList, ProductFacetCount)
 from registration.models import User
 
 
@@ -35,10 +46,52 @@ class TestProductModel(TestCase):
         expected_images = (image_1.image_path, image_2.image_path)
         self.assertIn(product.featured_image, expected_images)
 
+    def test_featured_image_with_prefetch(self):
+        product = Product.objects.first()
+        image = Image.objects.create(
+            product=product, name="image 1", image_path="1.jpg", image_type=Image.FEATURED_IMAGE)
+        Image.objects.create(
+            product=product, name="image 2", image_path="2.jpg", image_type=Image.BANNER_IMAGE)
+
+        product = Product.objects.with_featured_image().first()
+        with self.assertNumQueries(0):
+            self.assertEqual(image.image_path, product.featured_image)
+
+    def test_no_featured_image_with_prefetch(self):
+        product = Product.objects.with_featured_image().first()
+        with self.assertNumQueries(0):
+            self.assertIsNone(product.featured_image)
+
     def test_discounted_price(self):
         discounted_price = 45
         self.assertEqual(discounted_price, self.product.discount_price)
 
+    def test_effective_price_is_stored(self):
+        self.product.refresh_from_db()
+        self.assertEqual(Decimal('45.00'), self.product.effective_price)
+
+    def test_effective_price_follows_save(self):
+        self.product.discount_percent = 15
+        self.product.save(update_fields=['discount_percent'])
+        self.product.refresh_from_db()
+        self.assertEqual(Decimal('43.00'), self.product.effective_price)
+
+    def test_effective_price_follows_update(self):
+        Product.objects.filter(pk=self.product.pk).update(price=F('price') * 2)
+        self.product.refresh_from_db()
+        self.assertEqual(Decimal('90.00'), self.product.effective_price)
+        self.assertEqual(self.product.discount_price, self.product.effective_price)
+
+    def test_effective_price_follows_bulk_operations(self):
+        Product.objects.bulk_create([Product(name="Other", price=199.0, discount_percent=15)])
+        product = Product.objects.get(name="Other")
+        self.assertEqual(Decimal('170.00'), product.effective_price)
+
+        product.price = 99.99
+        product.discount_percent = 0
+        Product.objects.bulk_update([product], ['price', 'discount_percent'])
+        self.assertEqual(Decimal('99.99'), Product.objects.get(name="Other").effective_price)
+
     def test_starts(self):
         self.product.rating = 3
         self.assertEqual(range(3), self.product.stars)
@@ -73,6 +126,123 @@ class TestProductModel(TestCase):
         self.assertEqual(initial_quantity, self.product.quantity)
 
 
+class TestReduceQuantities(TestCase):
+    def setUp(self):
+        self.product_1 = Product.objects.create(name="Name 1", price=50.0, quantity=10)
+        self.product_2 = Product.objects.create(name="Name 2", price=50.0, quantity=5)
+
+    def assertQuantities(self, quantity_1, quantity_2):
+        self.product_1.refresh_from_db()
+        self.product_2.refresh_from_db()
+        self.assertEqual(quantity_1, self.product_1.quantity)
+        self.assertEqual(quantity_2, self.product_2.quantity)
+
+    def test_reduce_quantities_of_many_products(self):
+        quantities = {self.product_1.pk: 3, self.product_2.pk: 2}
+        with self.assertNumQueries(4) as queries:
+            self.assertTrue(Product.objects.reduce_quantities(quantities))
+        updates = [query for query in queries.captured_queries
+                   if query['sql'].startswith('UPDATE')]
+        self.assertEqual(1, len(updates))
+        self.assertQuantities(7, 3)
+
+    def test_one_product_short_of_stock_changes_nothing(self):
+        quantities = {self.product_1.pk: 3, self.product_2.pk: 6}
+        self.assertFalse(Product.objects.reduce_quantities(quantities))
+        self.assertQuantities(10, 5)
+
+    def test_unknown_product(self):
+        quantities = {self.product_1.pk: 3, 1000: 1}
+        self.assertFalse(Product.objects.reduce_quantities(quantities))
+        self.assertQuantities(10, 5)
+
+    def test_non_positive_quantity(self):
+        self.assertFalse(Product.objects.reduce_quantities({self.product_1.pk: 0}))
+        self.assertFalse(Product.objects.reduce_quantities(
+            {self.product_1.pk: 1, self.product_2.pk: -1}))
+        self.assertFalse(Product.objects.reduce_quantities({}))
+        self.assertQuantities(10, 5)
+
+    @mock.patch('ecommerce.models.catalog_page_cache')
+    def test_stock_reaching_zero_invalidates_catalog_pages(self, page_cache):
+        Product.objects.reduce_quantities({self.product_1.pk: 1})
+        page_cache.invalidate.assert_not_called()
+
+        Product.objects.reduce_quantities({self.product_2.pk: 5})
+        page_cache.invalidate.assert_called_once_with()
+
+
+class TestProductFacetCount(TestCase):
+    def setUp(self):
+        self.category = ProductCategory.objects.create(name="Category")
+        self.product_1 = Product.objects.create(
+            name="Name 1", price=50.0, quantity=10, rating=4, category=self.category)
+        self.product_2 = Product.objects.create(name="Name 2", price=600.0, quantity=0)
+
+    def get_counts(self):
+        return {(cell.category, cell.price_band, cell.rating, cell.in_stock): cell.count
+                for cell in ProductFacetCount.objects.filter(count__gt=0)}
+
+    def assertCountsAreRebuilt(self):
+        counts = self.get_counts()
+        ProductFacetCount.objects.rebuild()
+        self.assertEqual(self.get_counts(), counts)
+
+    def test_create(self):
+        self.assertEqual(
+            {(self.category.pk, 0, 4, True): 1, (0, 2, 0, False): 1}, self.get_counts())
+        self.assertCountsAreRebuilt()
+
+    def test_save(self):
+        self.product_1.category = None
+        self.product_1.price = 150.0
+        self.product_1.save()
+        self.assertEqual({(0, 1, 4, True): 1, (0, 2, 0, False): 1}, self.get_counts())
+        self.assertCountsAreRebuilt()
+
+    def test_save_of_product_loaded_without_facet_fields(self):
+        product = Product.objects.only('name').get(pk=self.product_2.pk)
+        product.quantity = 5
+        product.save()
+        self.assertEqual(
+            {(self.category.pk, 0, 4, True): 1, (0, 2, 0, True): 1}, self.get_counts())
+
+    def test_delete(self):
+        Product.objects.filter(pk=self.product_1.pk).delete()
+        self.assertEqual({(0, 2, 0, False): 1}, self.get_counts())
+
+    def test_queryset_update(self):
+        Product.objects.update(rating=2, quantity=F('quantity') + 1)
+        self.assertEqual(
+            {(self.category.pk, 0, 2, True): 1, (0, 2, 2, True): 1}, self.get_counts())
+        self.assertCountsAreRebuilt()
+
+    def test_bulk_create(self):
+        Product.objects.bulk_create([Product(name="Name 3", price=20000.0, quantity=1)])
+        self.assertEqual(1, self.get_counts()[(0, 4, 0, True)])
+        self.assertCountsAreRebuilt()
+
+    def test_sold_out(self):
+        self.assertTrue(Product.objects.reduce_quantities({self.product_1.pk: 10}))
+        self.assertEqual(
+            {(self.category.pk, 0, 4, False): 1, (0, 2, 0, False): 1}, self.get_counts())
+        self.assertCountsAreRebuilt()
+
+    def test_get_counts(self):
+        Product.objects.create(name="Name 3", price=80.0, quantity=1, rating=5)
+
+        counts = ProductFacetCount.objects.get_counts(price_band=0)
+        self.assertEqual({self.category.pk: 1, 0: 1}, dict(counts['category']))
+        # The price band counts ignore the price band filter
+        self.assertEqual({0: 2, 2: 1}, dict(counts['price_band']))
+        self.assertEqual({1: 2, 2: 2, 3: 2, 4: 2, 5: 1}, dict(counts['rating']))
+        self.assertEqual({True: 2}, dict(counts['in_stock']))
+
+        counts = ProductFacetCount.objects.get_counts(rating=5, in_stock=True)
+        self.assertEqual({0: 1}, dict(counts['price_band']))
+        self.assertEqual({1: 2, 2: 2, 3: 2, 4: 2, 5: 1}, dict(counts['rating']))
+
+
 class TestImageModel(TestCase):
     def setUp(self):
         product = Product.objects.create(
@@ -107,6 +277,37 @@ class TestCartModel(TestCase):
         expected_name = "{0} - {1}".format(self.user.username, self.product.name)
         self.assertEqual(expected_name, str(cart))
 
+    def test_duplicate_cart_item(self):
+        with self.assertRaises(IntegrityError):
+            Cart.objects.create(user=self.user, product=self.product, quantity=1)
+
+    def test_add_product_increments_quantity_in_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(Cart.objects.add_product(self.user, self.product.pk))
+        self.cart.refresh_from_db()
+        self.assertEqual(2, self.cart.quantity)
+
+    def test_add_new_product_in_two_queries(self):
+        product = Product.objects.create(name="Name 2", price=50.0, quantity=1)
+        with self.assertNumQueries(2):
+            self.assertTrue(Cart.objects.add_product(self.user, product.pk))
+        self.assertEqual(1, Cart.objects.get(user=self.user, product=product).quantity)
+
+    def test_add_product_capped_at_stock(self):
+        Cart.objects.filter(pk=self.cart.pk).update(quantity=10)
+        self.assertFalse(Cart.objects.add_product(self.user, self.product.pk))
+        self.cart.refresh_from_db()
+        self.assertEqual(10, self.cart.quantity)
+
+    def test_add_product_out_of_stock(self):
+        product = Product.objects.create(name="Name 2", price=50.0, quantity=0)
+        self.assertFalse(Cart.objects.add_product(self.user, product.pk))
+        self.assertFalse(Cart.objects.filter(product=product).exists())
+
+    def test_add_unknown_product(self):
+        with self.assertRaises(Product.DoesNotExist):
+            Cart.objects.add_product(self.user, 1000)
+
 
 class TestOrderModel(TestCase):
     def setUp(self):
@@ -138,6 +339,15 @@ class TestOrderModel(TestCase):
 
         self.assertEqual(OrderList.objects.count(), self.order.order_list_count)
 
+    def test_with_item_totals(self):
+        OrderList.objects.create(product=self.product1, order=self.order, quantity=1)
+        OrderList.objects.create(product=self.product2, order=self.order, quantity=2)
+
+        with self.assertNumQueries(1):
+            order = Order.objects.with_item_totals().get(pk=self.order.pk)
+            self.assertEqual(2, order.order_list_count)
+            self.assertEqual(3, order.items_quantity)
+
 
 class TestOrderListModel(TestCase):
     def setUp(self):
@@ -153,3 +363,60 @@ class TestOrderListModel(TestCase):
         order_list = OrderList.objects.first()
 
         self.assertEqual(expected_object_name, str(order_list))
+
+    def test_backfill_order_lines(self):
+        Image.objects.create(
+            name="Image", product=self.product, image_path='products/a.jpg',
+            image_type=Image.FEATURED_IMAGE)
+        other_order_list = OrderList.objects.create(
+            order=self.order, product=self.product, quantity=2, product_name="Kept",
+            unit_price=40.0)
+
+        call_command('backfill_order_lines', batch_size=1, stdout=StringIO())
+
+        self.order_list.refresh_from_db()
+        self.assertEqual(
+            ("Name", 50.0, 10, 'products/a.jpg', 45.0),
+            (self.order_list.product_name, self.order_list.unit_price,
+             self.order_list.discount_percent, self.order_list.image_path,
+             self.order_list.discount_price))
+        other_order_list.refresh_from_db()
+        self.assertEqual(
+            ("Kept", 40.0), (other_order_list.product_name, other_order_list.unit_price))
+
+
+class TestLoadProductData(TestCase):
+    def setUp(self):
+        self.source_dir = tempfile.TemporaryDirectory()
+        self.media_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.source_dir.cleanup)
+        self.addCleanup(self.media_dir.cleanup)
+        os.makedirs(os.path.join(self.media_dir.name, 'products'))
+        with open(os.path.join(self.source_dir.name, 'mug.jpg'), 'wb') as image_file:
+            image_file.write(b'image')
+        with open(os.path.join(self.source_dir.name, 'products.json'), 'w') as source_file:
+            json.dump([
+                {'name': 'mug', 'description': 'A mug', 'image': 'mug.jpg'},
+                {'name': 'pen'},
+                {'name': 'Pen'},
+                {'name': 'lamp', 'image': 'missing.jpg'},
+                {'name': 'existing'},
+            ], source_file)
+        Product.objects.create(name="Existing")
+        ProductCategory.objects.create(name="Category")
+
+    def test_load_from_directory(self):
+        with override_settings(MEDIA_ROOT=self.media_dir.name + '/'):
+            call_command(
+                'load_product_data', source=self.source_dir.name, batch_size=1, workers=2,
+                stdout=StringIO())
+
+        self.assertEqual(
+            ["Existing", "Mug", "Pen"], list(Product.objects.order_by('name').values_list(
+                'name', flat=True)))
+        mug = Product.objects.get(name="Mug")
+        self.assertEqual("A mug", mug.description)
+        self.assertEqual("Category", mug.category.name)
+        self.assertEqual('products/mug.jpg', mug.featured_image)
+        self.assertTrue(os.path.exists(os.path.join(self.media_dir.name, 'products', 'mug.jpg')))
+        self.assertIsNone(Product.objects.get(name="Pen").featured_image)
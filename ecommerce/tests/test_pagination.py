@@ -0,0 +1,81 @@
+from django.test import TestCase
+
+from ecommerce.models import Product
+from ecommerce.pagination import KeysetPaginator, InvalidCursor, encode_cursor
+
+
+class TestKeysetPaginator(TestCase):
+    def setUp(self):
+        for i in range(7):
+            Product.objects.create(name="Product {0}".format(i), price=float(i % 3), quantity=1)
+        self.products = list(Product.objects.order_by('price', 'pk'))
+
+    def test_first_page(self):
+        page = KeysetPaginator(Product.objects.all(), ('price', 'pk'), per_page=3).page()
+        self.assertEqual(self.products[:3], page.object_list)
+        self.assertTrue(page.has_next)
+        self.assertFalse(page.has_previous)
+
+    def test_walk_forward_and_back(self):
+        paginator = KeysetPaginator(Product.objects.all(), ('price', 'pk'), per_page=3)
+        page_1 = paginator.page()
+        page_2 = paginator.page(after=page_1.next_cursor)
+        page_3 = paginator.page(after=page_2.next_cursor)
+
+        self.assertEqual(self.products[3:6], page_2.object_list)
+        self.assertEqual(self.products[6:], page_3.object_list)
+        self.assertFalse(page_3.has_next)
+
+        previous_page = paginator.page(before=page_3.previous_cursor)
+        self.assertEqual(page_2.object_list, previous_page.object_list)
+        self.assertEqual(page_1.object_list, paginator.page(
+            before=previous_page.previous_cursor).object_list)
+
+    def test_descending_ordering(self):
+        paginator = KeysetPaginator(Product.objects.all(), ('-price', '-pk'), per_page=4)
+        page_1 = paginator.page()
+        page_2 = paginator.page(after=page_1.next_cursor)
+
+        expected = list(reversed(self.products))
+        self.assertEqual(expected[:4], page_1.object_list)
+        self.assertEqual(expected[4:], page_2.object_list)
+
+    def test_no_count_or_offset_query(self):
+        paginator = KeysetPaginator(Product.objects.all(), per_page=3)
+        cursor = paginator.page().next_cursor
+
+        with self.assertNumQueries(1) as queries:
+            paginator.page(after=cursor)
+        sql = queries.captured_queries[0]['sql']
+        self.assertNotIn('COUNT', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_invalid_cursor(self):
+        paginator = KeysetPaginator(Product.objects.all())
+        with self.assertRaises(InvalidCursor):
+            paginator.page(after="not a cursor")
+        with self.assertRaises(InvalidCursor):
+            paginator.page(after=encode_cursor([1, 2]))
+        with self.assertRaises(InvalidCursor):
+            paginator.page(after=encode_cursor(["abc"]))
+
+    def test_out_of_range_cursor(self):
+        paginator = KeysetPaginator(Product.objects.all())
+        with self.assertRaises(InvalidCursor):
+            # [1e400] decodes to infinity
+            paginator.page(after="WzFlNDAwXQ")
+        with self.assertRaises(InvalidCursor):
+            paginator.page(after=encode_cursor([10 ** 30]))
+        with self.assertRaises(InvalidCursor):
+            paginator.page(before=encode_cursor([10 ** 30]))
+
+    def test_cursor_value_of_wrong_type(self):
+        paginator = KeysetPaginator(Product.objects.all())
+        for values in ([1.5], [True], [[1]], [None], [{"pk": 1}]):
+            with self.assertRaises(InvalidCursor):
+                paginator.page(after=encode_cursor(values))
+
+    def test_float_cursor_for_float_field(self):
+        paginator = KeysetPaginator(Product.objects.all(), ('price', 'pk'), per_page=3)
+        page = paginator.page(after=encode_cursor([0.5, 0]))
+        self.assertEqual(self.products[3:6], page.object_list)
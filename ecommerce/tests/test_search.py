@@ -0,0 +1,126 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from ecommerce.models import Product, ProductSearchTerm
+from ecommerce.pagination import InvalidCursor
+from ecommerce.search import (
+    FTS5SearchIndex, InvertedSearchIndex, get_search_index, has_fts5, search_products, tokenize)
+
+
+class SearchTestMixin:
+    def setUp(self):
+        self.laptop = Product.objects.create(
+            name="Blue Laptop", description="<p>A fast computer</p>", price=500.0)
+        self.bag = Product.objects.create(
+            name="Laptop bag", description="Carries a blue laptop", price=20.0)
+        self.pen = Product.objects.create(name="Pen", description="Blue ink", price=1.0)
+
+    def search(self, query, **kwargs):
+        return list(search_products(query, **kwargs))
+
+    def test_products_matching_every_word(self):
+        self.assertCountEqual([self.laptop, self.bag], self.search("blue laptop"))
+        self.assertEqual([self.laptop], self.search("FAST laptop"))
+        self.assertEqual([], self.search("red laptop"))
+
+    def test_name_ranks_higher_than_description(self):
+        self.assertEqual([self.pen], self.search("ink"))
+        self.assertEqual(self.laptop, self.search("blue")[0])
+
+    def test_html_is_not_indexed(self):
+        self.assertEqual([], self.search("p"))
+
+    def test_empty_query(self):
+        self.assertEqual([], self.search(" !? "))
+
+    def test_index_follows_changes(self):
+        self.pen.name = "Red marker"
+        self.pen.save()
+        self.assertEqual([], self.search("pen"))
+        self.assertEqual([self.pen], self.search("marker"))
+
+        self.bag.delete()
+        self.assertEqual([self.laptop], self.search("laptop"))
+
+    def test_pages(self):
+        products = [
+            Product.objects.create(name="Mug {0}".format(i), description="mug " * (i % 3))
+            for i in range(7)]
+
+        page = search_products("mug", per_page=3)
+        seen = list(page)
+        while page.has_next:
+            page = search_products("mug", after=page.next_cursor, per_page=3)
+            seen += list(page)
+        self.assertEqual(sorted(products, key=lambda product: product.pk),
+                         sorted(seen, key=lambda product: product.pk))
+        self.assertEqual(len(products), len(seen))
+
+        previous_page = search_products("mug", before=page.previous_cursor, per_page=3)
+        self.assertEqual(seen[3:6], list(previous_page))
+
+    def test_invalid_cursor(self):
+        for cursor in ('invalid', 'WyJhIiwxXQ', 'WzEsImEiXQ'):
+            with self.assertRaises(InvalidCursor):
+                search_products("laptop", after=cursor)
+
+    def test_rebuild_command(self):
+        get_search_index().clear()
+        self.assertEqual([], self.search("laptop"))
+
+        call_command('rebuild_search_index', batch_size=2, stdout=StringIO())
+        self.assertCountEqual([self.laptop, self.bag], self.search("laptop"))
+
+
+class TestFTS5Search(SearchTestMixin, TestCase):
+    def setUp(self):
+        if not has_fts5(connection.alias):
+            self.skipTest("SQLite is built without FTS5")
+        super(TestFTS5Search, self).setUp()
+
+    def test_fts5_is_used(self):
+        self.assertIsInstance(get_search_index(), FTS5SearchIndex)
+
+
+class TestInvertedIndexSearch(SearchTestMixin, TestCase):
+    def setUp(self):
+        patcher = mock.patch('ecommerce.search.has_fts5', return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super(TestInvertedIndexSearch, self).setUp()
+
+    def test_terms_are_weighted(self):
+        self.assertIsInstance(get_search_index(), InvertedSearchIndex)
+        self.assertEqual(
+            {'blue': 1, 'laptop': 4, 'bag': 3, 'carries': 1, 'a': 1},
+            dict(ProductSearchTerm.objects.filter(product=self.bag).values_list('term', 'weight')))
+
+
+def test_tokenize():
+    assert ['café', 'au', 'lait', '2'] == tokenize("<b>Café</b> au-lait, 2!")
+
+
+class TestProductSearchView(TestCase):
+    url = reverse('search')
+
+    def test_results(self):
+        laptop = Product.objects.create(name="Laptop", price=500.0, rating=4)
+        Product.objects.create(name="Pen", price=1.0, rating=4)
+
+        response = self.client.get(self.url, {'q': 'laptop'})
+        self.assertTemplateUsed(response, 'ecommerce/search.html.haml')
+        self.assertEqual([laptop], list(response.context['product_list']))
+        self.assertContains(response, 'Results for "laptop"')
+
+    def test_no_results(self):
+        response = self.client.get(self.url, {'q': 'laptop'})
+        self.assertContains(response, 'No products found')
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(self.url, {'q': 'laptop', 'after': 'invalid'})
+        self.assertEqual(404, response.status_code)
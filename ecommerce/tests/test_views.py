@@ -1,10 +1,13 @@
+from unittest import mock
+
 import pytest
-from django.db import IntegrityError
+from django.db import IntegrityError, connection
 from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from ecommerce.models import Product, ProductCategory, Cart, Order, OrderList, Image
-from ecommerce.views import get_total_price_of_cart, CheckoutPageView
+from ecommerce.views import get_total_price_of_cart, CheckoutPageView, ProductListView
 from registration.models import User
 
 
@@ -75,6 +78,139 @@ class TestProductListView(TestCase):
         response = self.client.get(self.url + '?category=Category1')
         self.assertContains(response, 'No products')
 
+    def test_featured_images_do_not_add_queries_per_product(self):
+        def create_products(start, end):
+            for i in range(start, end):
+                product = Product.objects.create(
+                    name="Product {0}".format(i), price=10.0, quantity=1, rating=1)
+                Image.objects.create(
+                    product=product, name="{0}.jpg".format(i),
+                    image_path="{0}.jpg".format(i), image_type=Image.FEATURED_IMAGE)
+
+        create_products(0, 2)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        query_count = len(queries)
+
+        create_products(2, 7)
+        with self.assertNumQueries(query_count):
+            response = self.client.get(self.url)
+        self.assertContains(response, '/media/6.jpg')
+
+    @mock.patch.object(ProductListView, 'page_size', 3)
+    def test_products_are_paginated(self):
+        self.populate_products()
+        response = self.client.get(self.url)
+        self.assertEqual(
+            [self.product_1, self.product_2, self.product_3],
+            list(response.context['product_list']))
+        self.assertNotIn('previous_page_url', response.context)
+
+        response = self.client.get(self.url + response.context['next_page_url'])
+        self.assertEqual([self.product_4], list(response.context['product_list']))
+        self.assertNotIn('next_page_url', response.context)
+
+        response = self.client.get(self.url + response.context['previous_page_url'])
+        self.assertContains(response, 'Product A')
+        self.assertNotContains(response, 'Product D')
+
+    @mock.patch.object(ProductListView, 'page_size', 2)
+    def test_next_page_keeps_category(self):
+        self.populate_products()
+        category = ProductCategory.objects.create(name="Category1")
+        Product.objects.update(category=category)
+
+        response = self.client.get(self.url, {'category': 'Category1'})
+        self.assertIn('category=Category1', response.context['next_page_url'])
+
+    def test_invalid_page_cursor(self):
+        response = self.client.get(self.url, {'after': 'invalid'})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(self.url, {'after': 'WzFlNDAwXQ'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_sort_by_price(self):
+        self.populate_products()
+
+        response = self.client.get(self.url, {'sort': 'price'})
+        self.assertEqual(
+            [self.product_2, self.product_1, self.product_3, self.product_4],
+            list(response.context['product_list']))
+
+        response = self.client.get(self.url, {'sort': '-price'})
+        self.assertEqual(
+            [self.product_4, self.product_3, self.product_1, self.product_2],
+            list(response.context['product_list']))
+
+    def test_sorted_pages_keep_order(self):
+        products = [
+            Product.objects.create(name=str(i), price=i % 7, rating=1) for i in range(25)]
+        products.sort(key=lambda product: (product.price, product.pk))
+
+        response = self.client.get(self.url, {'sort': 'price'})
+        self.assertEqual(products[:20], list(response.context['product_list']))
+        response = self.client.get(self.url + response.context['next_page_url'])
+        self.assertEqual(products[20:], list(response.context['product_list']))
+        response = self.client.get(self.url + response.context['previous_page_url'])
+        self.assertEqual(products[:20], list(response.context['product_list']))
+
+    def test_filter_by_price(self):
+        self.populate_products()
+
+        response = self.client.get(self.url, {'min_price': '50', 'max_price': '150'})
+        self.assertEqual(
+            [self.product_1, self.product_3], list(response.context['product_list']))
+        response = self.client.get(self.url, {'min_price': '85.5'})
+        self.assertEqual(
+            [self.product_3, self.product_4], list(response.context['product_list']))
+
+    def test_invalid_price_filter_is_ignored(self):
+        self.populate_products()
+        response = self.client.get(self.url, {'min_price': 'cheap', 'max_price': 'NaN'})
+        self.assertEqual(4, len(response.context['product_list']))
+
+    def test_facet_filters(self):
+        self.populate_products()
+        Product.objects.filter(pk=self.product_2.pk).update(quantity=0)
+
+        response = self.client.get(self.url, {'price_band': '1'})
+        self.assertEqual([self.product_3], list(response.context['product_list']))
+        response = self.client.get(self.url, {'rating': '4'})
+        self.assertEqual([self.product_1, self.product_2], list(response.context['product_list']))
+        response = self.client.get(self.url, {'rating': '4', 'in_stock': '1'})
+        self.assertEqual([self.product_1], list(response.context['product_list']))
+        response = self.client.get(self.url, {'price_band': '9', 'rating': 'x'})
+        self.assertEqual(4, len(response.context['product_list']))
+
+    def test_facet_counts(self):
+        self.populate_products()
+        category = ProductCategory.objects.create(name="Category1")
+        Product.objects.filter(pk__in=[self.product_1.pk, self.product_4.pk]).update(
+            category=category)
+
+        response = self.client.get(self.url, {'rating': '4'})
+        facets = response.context['facets']
+        self.assertEqual(
+            [("Category1", 1, False)],
+            [(item['label'], item['count'], item['selected']) for item in facets['categories']])
+        self.assertEqual(
+            [("0 - 99", 2, False)],
+            [(item['label'], item['count'], item['selected']) for item in facets['price_bands']])
+        self.assertEqual(
+            [("4+", 2, True), ("3+", 2, False), ("2+", 3, False), ("1+", 4, False)],
+            [(item['label'], item['count'], item['selected']) for item in facets['ratings']])
+        self.assertEqual(2, facets['in_stock']['count'])
+        # Selecting the selected value again removes the filter
+        self.assertEqual('?', facets['ratings'][0]['url'])
+        self.assertContains(response, 'Category1 (1)')
+
+    def test_invalid_price_cursor(self):
+        self.populate_products()
+        # ["NaN", 1] and ["cheap", 1]
+        for cursor in ('WyJOYU4iLDFd', 'WyJjaGVhcCIsMV0'):
+            response = self.client.get(self.url, {'sort': 'price', 'after': cursor})
+            self.assertEqual(response.status_code, 404)
+
     def test_banner_image(self):
         self.populate_products()
         Image.objects.create(
@@ -89,7 +225,7 @@ class TestProductListView(TestCase):
             image_type=Image.BANNER_IMAGE)
 
         response = self.client.get(self.url)
-        self.assertEqual(response.context['banner_image_list'].count(), 2)
+        self.assertEqual(len(response.context['banner_image_list']), 2)
 
     def test_banner_images_greater_than_three(self):
         self.populate_products()
@@ -115,7 +251,7 @@ class TestProductListView(TestCase):
             image_type=Image.BANNER_IMAGE)
 
         response = self.client.get(self.url)
-        self.assertEqual(response.context['banner_image_list'].count(), 3)
+        self.assertEqual(len(response.context['banner_image_list']), 3)
 
 
 @pytest.mark.django_db
@@ -180,16 +316,22 @@ class EcommerceTestCase(TestCase):
 
         self.order = Order.objects.create(
             user=self.user, amount=(self.p1.discount_price + self.p2.discount_price))
-        OrderList.objects.create(order=self.order, product=self.p1, quantity=1)
-        OrderList.objects.create(order=self.order, product=self.p2, quantity=1)
+        for product in (self.p1, self.p2):
+            order_item = OrderList(order=self.order, product=product, quantity=1)
+            order_item.snapshot_product(product)
+            order_item.save()
 
 
 class TestCartListView(EcommerceTestCase):
     url = reverse('cart')
 
-    def test_redirects_to_login_if_not_logged_in(self):
-        response = self.client.get(self.url, follow=True)
-        self.assertTemplateUsed(response, template_name='account/login.html.haml')
+    def test_anonymous_cart(self):
+        self.create_products()
+        self.client.post(reverse('add_to_cart'), {'product': self.p1.pk})
+
+        response = self.client.get(self.url)
+        self.assertTemplateUsed(response, template_name='ecommerce/cart.html.haml')
+        self.assertEqual([self.p1], [item.product for item in response.context['cart_list']])
 
     def test_template_is_cart(self):
         """
@@ -220,9 +362,27 @@ class TestCartListView(EcommerceTestCase):
 class TestCartAddView(EcommerceTestCase):
     url = reverse('add_to_cart')
 
-    def test_redirects_to_login_if_not_logged_in(self):
-        response = self.client.get(self.url, follow=True)
-        self.assertTemplateUsed(response, template_name='account/login.html.haml')
+    def test_anonymous_add_does_not_write_to_database(self):
+        self.create_products()
+        response = self.client.post(self.url, {'product': self.p1.pk}, follow=True)
+        self.assertTemplateUsed(response, 'ecommerce/cart.html.haml')
+        self.assertIn('cart', self.client.cookies)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_anonymous_add_unknown_product(self):
+        response = self.client.post(self.url, {'product': 100})
+        self.assertEqual(response.status_code, 404)
+
+    def test_anonymous_cart_is_merged_on_login(self):
+        self.create_products()
+        self.client.post(self.url, {'product': self.p1.pk})
+        self.client.post(self.url, {'product': self.p1.pk})
+
+        User.objects.create_user(username='testuser', password='secret@123')
+        response = self.client.post(
+            reverse('account_login'), {'login': 'testuser', 'password': 'secret@123'})
+        self.assertEqual(2, Cart.objects.get(user__username='testuser', product=self.p1).quantity)
+        self.assertEqual('', response.cookies['cart'].value)
 
     def test_get_request_redirects_home(self):
         self.login()
@@ -319,9 +479,19 @@ class TestCartAddView(EcommerceTestCase):
 class TestCartDeleteView(EcommerceTestCase):
     url = reverse('delete_from_cart')
 
-    def test_redirects_to_login_if_not_logged_in(self):
-        response = self.client.get(self.url, follow=True)
-        self.assertTemplateUsed(response, template_name='account/login.html.haml')
+    def test_anonymous_delete_from_cart(self):
+        self.create_products()
+        self.client.post(reverse('add_to_cart'), {'product': self.p1.pk})
+        self.client.post(reverse('add_to_cart'), {'product': self.p2.pk})
+
+        self.client.post(self.url, {'product': self.p1.pk})
+        response = self.client.get(reverse('cart'))
+        self.assertEqual([self.p2], [item.product for item in response.context['cart_list']])
+
+    def test_anonymous_delete_product_not_in_cart(self):
+        self.create_products()
+        response = self.client.post(self.url, {'product': self.p1.pk})
+        self.assertEqual(response.status_code, 404)
 
     def test_get_request_redirects_home(self):
         self.login()
@@ -392,6 +562,38 @@ class TestOrderListView(EcommerceTestCase):
         expected_order = Order.objects.filter(user=self.user)
         self.assertEqual(list(response.context['order_list']), list(expected_order))
 
+    def test_orders_are_annotated_with_item_totals(self):
+        self.login()
+        self.create_order()
+        OrderList.objects.filter(product=self.p1).update(quantity=3)
+
+        response = self.client.get(self.url)
+        order = response.context['order_list'][0]
+        self.assertEqual(2, order.items_count)
+        self.assertEqual(4, order.items_quantity)
+        self.assertContains(response, 'Items: 2 (4 units)')
+
+    def test_orders_are_paginated_newest_first(self):
+        self.login()
+        orders = [Order.objects.create(user=self.user, amount=i) for i in range(25)]
+        orders.reverse()
+
+        response = self.client.get(self.url)
+        self.assertEqual(orders[:20], list(response.context['order_list']))
+        self.assertNotIn('previous_page_url', response.context)
+
+        response = self.client.get(self.url + response.context['next_page_url'])
+        self.assertEqual(orders[20:], list(response.context['order_list']))
+        self.assertNotIn('next_page_url', response.context)
+
+        response = self.client.get(self.url + response.context['previous_page_url'])
+        self.assertEqual(orders[:20], list(response.context['order_list']))
+
+    def test_invalid_cursor_returns_404(self):
+        self.login()
+        response = self.client.get(self.url, {'after': 'WyJub3QgYSBkYXRlIiwxXQ'})
+        self.assertEqual(404, response.status_code)
+
 
 class TestOrderDetailView(EcommerceTestCase):
 
@@ -409,6 +611,33 @@ class TestOrderDetailView(EcommerceTestCase):
         response = self.client.get(url)
         self.assertTemplateUsed(response, 'ecommerce/order_detail.html.haml')
 
+    def test_order_is_rendered_without_reading_products(self):
+        self.login()
+        self.create_order()
+        url = reverse('order_detail', args={self.order.pk})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertFalse(any('"ecommerce_product"' in query['sql'] for query in queries))
+        self.assertContains(response, 'Product A')
+        self.assertContains(response, '&#8377; 85.0')
+
+    def test_order_shows_price_paid(self):
+        self.login()
+        self.create_order()
+        Product.objects.filter(pk=self.p1.pk).update(name="Renamed", price=500.0)
+
+        response = self.client.get(reverse('order_detail', args={self.order.pk}))
+        self.assertContains(response, 'Product A')
+        self.assertContains(response, '&#8377; 85.0')
+
+    def test_order_of_other_user_is_not_found(self):
+        self.user = User.objects.create_user(username="other", password="password")
+        self.create_order()
+        self.login()
+        response = self.client.get(reverse('order_detail', args={self.order.pk}))
+        self.assertEqual(404, response.status_code)
+
 
 class TestCheckoutPageView(EcommerceTestCase):
     url = reverse('checkout')
@@ -482,6 +711,41 @@ class TestCheckoutPageView(EcommerceTestCase):
         response = self.client.post(self.url, follow=True)
         self.assertEqual(response.context['order'], Order.objects.get(user=self.user))
 
+    def test_order_lines_are_created(self):
+        self.login()
+        self.create_cart_items()
+
+        self.client.post(self.url)
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(
+            [(self.p1.pk, 2), (self.p2.pk, 1)],
+            list(order.orderlist_set.order_by('product').values_list('product', 'quantity')))
+        self.assertEqual(
+            [("Product A", 100.0, 15, 85.0), ("Product B", 230.0, 10, 207.0)],
+            [(item.product_name, item.unit_price, item.discount_percent, item.discount_price)
+             for item in order.order_list])
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        self.p1.refresh_from_db()
+        self.assertEqual(1, self.p1.quantity)
+
+    def test_checkout_queries_do_not_depend_on_cart_size(self):
+        self.login()
+        self.create_cart_items()
+        self.user.wallet_balance = 100000
+        self.user.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url)
+        query_count = len(queries)
+
+        for i in range(5):
+            product = Product.objects.create(
+                name="Product {0}".format(i), price=10.0, quantity=5, rating=1)
+            Cart.objects.create(user=self.user, product=product, quantity=2)
+        with self.assertNumQueries(query_count):
+            self.client.post(self.url)
+        self.assertEqual(5, Order.objects.latest('pk').orderlist_set.count())
+
     def test_place_order_from_cart_method_raises_integrity_error_on_None_arguments(self):
         factory = RequestFactory()
         request = factory.get(self.url)
@@ -1,11 +1,12 @@
 from django.urls import path
 from django.views.generic import TemplateView
 
-from ecommerce.views import ProductListView, CartListView, CartAddView, \
+from ecommerce.views import ProductListView, ProductSearchView, CartListView, CartAddView, \
     CartDeleteView, CheckoutPageView, OrderListView, OrderDetailView
 
 urlpatterns = [
     path('', ProductListView.as_view(), name='home'),
+    path('search/', ProductSearchView.as_view(), name='search'),
     path('cart/', CartListView.as_view(), name='cart'),
     path('cart/add/', CartAddView.as_view(), name='add_to_cart'),
     path('cart/add/failed/', TemplateView.as_view(
@@ -1,36 +1,268 @@
-from django.http import Http404
+import hashlib
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
+
+from django.http import Http404, HttpResponse
+from django.middleware.csrf import get_token
 from django.shortcuts import redirect, render
 from django.views.generic import TemplateView, DetailView, ListView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db import transaction, IntegrityError
+from django.db import IntegrityError
+
+from ecommerce.cache import (
+    banner_list_cache, catalog_page_cache, cart_summary_cache, category_list_cache)
+from ecommerce.carts import get_cart
+from ecommerce.context_processors import get_category_list
+from ecommerce.models import (
+    Product, Cart, Order, OrderList, ProductCategory, ProductFacetCount, PRICE_BANDS,
+    get_banner_list, get_price_band_range)
+from ecommerce.pagination import KeysetPaginator, InvalidCursor
+from ecommerce.search import search_products
+from website.sqlite3.base import atomic_immediate
+
+
+CSRF_TOKEN_PLACEHOLDER = 'csrf-token-placeholder'
+
+
+class AnonymousPageCacheMixin:
+    """
+    Serves the page to anonymous users from catalog_page_cache, keyed by
+    the path and the query parameters in `page_cache_parameters`. Other
+    parameters do not change the page, so they must not create new entries.
+
+    Cached pages are rendered with a placeholder in place of the csrf token,
+    which is replaced with the token of the visitor whenever the page is served.
+    """
+
+    page_cache_parameters = ()
+
+    def get_page_cache_key(self):
+        query = urlencode(
+            [(name, self.request.GET.get(name)) for name in self.page_cache_parameters
+             if name in self.request.GET])
+        return hashlib.md5('{0}?{1}'.format(self.request.path, query).encode()).hexdigest()
+
+    def render_cacheable_page(self, request, *args, **kwargs):
+        self.cacheable_render = True
+        response = super(AnonymousPageCacheMixin, self).get(request, *args, **kwargs)
+        response.render()
+        return response.content, response['Content-Type']
+
+    def get_context_data(self, *args, **kwargs):
+        context = super(AnonymousPageCacheMixin, self).get_context_data(*args, **kwargs)
+        if getattr(self, 'cacheable_render', False):
+            context['csrf_token'] = CSRF_TOKEN_PLACEHOLDER
+        return context
+
+    def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super(AnonymousPageCacheMixin, self).get(request, *args, **kwargs)
+
+        content, content_type = catalog_page_cache.get_or_build(
+            lambda: self.render_cacheable_page(request, *args, **kwargs),
+            key=self.get_page_cache_key())
+        content = content.replace(CSRF_TOKEN_PLACEHOLDER.encode(), get_token(request).encode())
+        return HttpResponse(content, content_type=content_type)
+
+
+class KeysetPaginationMixin:
+    """
+    Paginates the ListView with KeysetPaginator using the `after` and
+    `before` cursors of the url, in place of the OFFSET based pagination
+    """
+
+    ordering = ('pk',)
+    page_size = 20
+
+    def get_page_url(self, **cursor):
+        """
+        Url of another page of the current listing, keeping the other query parameters
+        """
+        query = self.request.GET.copy()
+        query.pop('after', None)
+        query.pop('before', None)
+        query.update(cursor)
+        return '?{0}'.format(query.urlencode())
+
+    def get_page(self, after=None, before=None):
+        paginator = KeysetPaginator(self.object_list, self.get_ordering(), self.page_size)
+        return paginator.page(after=after, before=before)
 
-from ecommerce.models import Product, Cart, Order, OrderList, ProductCategory, Image
+    def get_context_data(self, *args, object_list=None, **kwargs):
+        try:
+            page = self.get_page(
+                after=self.request.GET.get('after'), before=self.request.GET.get('before'))
+        except InvalidCursor:
+            raise Http404("Invalid page")
+
+        context = super(KeysetPaginationMixin, self).get_context_data(
+            *args, object_list=page.object_list, **kwargs)
+        context['page'] = page
+        if page.has_next:
+            context['next_page_url'] = self.get_page_url(after=page.next_cursor)
+        if page.has_previous:
+            context['previous_page_url'] = self.get_page_url(before=page.previous_cursor)
+        return context
 
 
-class ProductListView(ListView):
+class ProductListView(AnonymousPageCacheMixin, KeysetPaginationMixin, ListView):
     model = Product
     template_name = 'ecommerce/product_list.html.haml'
+    # Read from the replica, see website.replicas
+    read_replica = True
+    context_object_name = 'product_list'
+    page_cache_parameters = (
+        'category', 'after', 'before', 'sort', 'min_price', 'max_price', 'price_band', 'rating',
+        'in_stock')
+    ratings = (4, 3, 2, 1)
+    # Values of the `sort` parameter, the orderings are served by the effective_price indexes
+    sort_orderings = {
+        'price': ('effective_price', 'pk'),
+        '-price': ('-effective_price', '-pk'),
+    }
+
+    def get_ordering(self):
+        return self.sort_orderings.get(self.request.GET.get('sort'), self.ordering)
+
+    def get_price_parameter(self, name):
+        """
+        Decimal value of a price filter, None when it is missing or not a number
+        """
+        try:
+            price = Decimal(self.request.GET.get(name, ''))
+        except InvalidOperation:
+            return None
+        return price if price.is_finite() else None
+
+    def filter_price(self, queryset):
+        min_price = self.get_price_parameter('min_price')
+        if min_price is not None:
+            queryset = queryset.filter(effective_price__gte=min_price)
+        max_price = self.get_price_parameter('max_price')
+        if max_price is not None:
+            queryset = queryset.filter(effective_price__lte=max_price)
+        return queryset
+
+    def get_choice_parameter(self, name, choices):
+        """
+        Integer value of a facet filter, None when it is missing or not one of `choices`
+        """
+        try:
+            value = int(self.request.GET.get(name, ''))
+        except ValueError:
+            return None
+        return value if value in choices else None
+
+    def get_facet_filters(self):
+        return {
+            'price_band': self.get_choice_parameter('price_band', range(len(PRICE_BANDS))),
+            'rating': self.get_choice_parameter('rating', self.ratings),
+            'in_stock': True if self.request.GET.get('in_stock') == '1' else None,
+        }
+
+    def filter_facets(self, queryset):
+        filters = self.get_facet_filters()
+        if filters['price_band'] is not None:
+            low, high = get_price_band_range(filters['price_band'])
+            queryset = queryset.filter(effective_price__gte=low)
+            if high is not None:
+                queryset = queryset.filter(effective_price__lt=high)
+        if filters['rating'] is not None:
+            queryset = queryset.filter(rating__gte=filters['rating'])
+        if filters['in_stock']:
+            queryset = queryset.filter(quantity__gt=0)
+        return queryset
 
     def get_queryset(self):
+        self.category = None
         if 'category' in self.request.GET:
-            category = None
             try:
-                category = ProductCategory.objects.get(name=self.request.GET.get("category"))
+                self.category = ProductCategory.objects.get(name=self.request.GET.get("category"))
             except ProductCategory.DoesNotExist:
-                return None
-            return self.model.objects.filter(category=category)
+                return self.model.objects.none()
+            queryset = self.model.objects.filter(category=self.category)
         else:
-            return super(ProductListView, self).get_queryset()
-
-    def get_context_data(self, *args, object_list=None, **kwargs):
+            queryset = self.model.objects.all()
+        return self.filter_facets(self.filter_price(queryset)).with_featured_image()
+
+    def get_filter_url(self, name, value):
+        """
+        Url of the first page of the listing with the filter `name` set to
+        `value`, or removed when it is already set to it
+        """
+        query = self.request.GET.copy()
+        query.pop('after', None)
+        query.pop('before', None)
+        if query.get(name) == str(value):
+            query.pop(name)
+        else:
+            query[name] = value
+        return '?{0}'.format(query.urlencode())
+
+    def get_facets(self):
+        """
+        Values of the filters with the number of products of each, among the
+        products matching the other filters, read from ProductFacetCount
+        """
+        filters = self.get_facet_filters()
+        category_pk = self.category.pk if self.category is not None else None
+        counts = ProductFacetCount.objects.get_counts(category=category_pk, **filters)
+
+        def facet(name, value, label, count, selected):
+            return {'label': label, 'count': count, 'selected': selected,
+                    'url': self.get_filter_url(name, value)}
+
+        categories = [
+            facet('category', category.name, category.name, counts['category'][category.pk],
+                  category.pk == category_pk)
+            for category in category_list_cache.get_or_build(get_category_list)]
+        price_bands = []
+        for price_band in range(len(PRICE_BANDS)):
+            low, high = get_price_band_range(price_band)
+            label = '{0} - {1}'.format(low, high - 1) if high is not None else '{0}+'.format(low)
+            price_bands.append(facet('price_band', price_band, label,
+                                     counts['price_band'][price_band],
+                                     price_band == filters['price_band']))
+        ratings = [
+            facet('rating', rating, '{0}+'.format(rating), counts['rating'][rating],
+                  rating == filters['rating'])
+            for rating in self.ratings]
+        in_stock = facet('in_stock', 1, 'In stock', counts['in_stock'][True],
+                         bool(filters['in_stock']))
+        return {
+            'categories': [item for item in categories if item['count'] or item['selected']],
+            'price_bands': [item for item in price_bands if item['count'] or item['selected']],
+            'ratings': [item for item in ratings if item['count'] or item['selected']],
+            'in_stock': in_stock,
+        }
+
+    def get_context_data(self, *args, **kwargs):
         context = super(ProductListView, self).get_context_data(*args, **kwargs)
-        banner_image_list = Image.objects.filter(image_type=Image.BANNER_IMAGE).order_by('-name')
+        context['sort'] = self.request.GET.get('sort', '')
+        context['min_price'] = self.request.GET.get('min_price', '')
+        context['max_price'] = self.request.GET.get('max_price', '')
+        context['facets'] = self.get_facets()
         if 'category' not in self.request.GET:
-            if banner_image_list.count() <= 3:
-                context['banner_image_list'] = banner_image_list
-            else:
-                # limit to 3 featured images for the carousal
-                context['banner_image_list'] = banner_image_list[:3]
+            # limit to 3 banner images for the carousal
+            context['banner_image_list'] = banner_list_cache.get_or_build(get_banner_list)
+        return context
+
+
+class ProductSearchView(KeysetPaginationMixin, ListView):
+    """
+    Products matching every word of the `q` parameter, best match first
+    """
+    model = Product
+    template_name = 'ecommerce/search.html.haml'
+    context_object_name = 'product_list'
+
+    def get_page(self, after=None, before=None):
+        return search_products(
+            self.request.GET.get('q', ''), after=after, before=before, per_page=self.page_size)
+
+    def get_context_data(self, *args, **kwargs):
+        context = super(ProductSearchView, self).get_context_data(*args, **kwargs)
+        context['query'] = self.request.GET.get('q', '')
         return context
 
 
@@ -42,18 +274,19 @@ def get_total_price_of_cart(cart_list):
     return total
 
 
-class CartListView(LoginRequiredMixin, TemplateView):
+class CartListView(TemplateView):
     template_name = 'ecommerce/cart.html.haml'
     model = Cart
 
     def get_context_data(self, **kwargs):
         context = super(CartListView, self).get_context_data(**kwargs)
-        context['cart_list'] = Cart.objects.filter(user=self.request.user)
-        context['total'] = get_total_price_of_cart(cart_list=context["cart_list"])
+        cart = get_cart(self.request)
+        context['cart_list'] = cart.get_items()
+        context['total'] = cart.get_summary().total
         return context
 
 
-class CartAddView(LoginRequiredMixin, TemplateView):
+class CartAddView(TemplateView):
     success_url = 'cart'
     cannot_add_to_cart_url = 'cannot_add_to_cart'
 
@@ -63,24 +296,9 @@ class CartAddView(LoginRequiredMixin, TemplateView):
     def post(self, request, *args):
         if 'product' in request.POST:
             try:
-                # Get the product that the user is trying to add to cart
-                product = Product.objects.get(pk=int(request.POST['product']))
-
-                # check if product is available
-                if product.quantity == 0:
+                # Add the product or increase its quantity, if it is in stock
+                if not get_cart(request).add(int(request.POST['product'])):
                     return redirect(self.cannot_add_to_cart_url)
-
-                # if already there in cart add quantity
-                if Cart.objects.filter(user=request.user, product=product).count() > 0:
-                    cart_item = Cart.objects.get(user=request.user, product=product)
-                    if cart_item.quantity >= product.quantity:
-                        return redirect(self.cannot_add_to_cart_url)
-                    cart_item.quantity += 1
-                    cart_item.save()
-
-                # Add product to cart
-                else:
-                    Cart.objects.create(user=request.user, product=product, quantity=1)
             except ValueError:
                 raise Http404
             except Product.DoesNotExist:
@@ -92,7 +310,7 @@ class CartAddView(LoginRequiredMixin, TemplateView):
         return redirect(self.success_url)
 
 
-class CartDeleteView(LoginRequiredMixin, TemplateView):
+class CartDeleteView(TemplateView):
     success_url = 'cart'
 
     def get(self, request, *args):
@@ -101,16 +319,10 @@ class CartDeleteView(LoginRequiredMixin, TemplateView):
     def post(self, request, *args):
         if 'product' in request.POST:
             try:
-                product = Product.objects.get(pk=int(request.POST['product']))
-                cart_item = Cart.objects.get(product=product, user=request.user)
-                cart_item.delete()
-
+                if not get_cart(request).remove(int(request.POST['product'])):
+                    raise Http404
             except ValueError:
                 raise Http404
-            except Product.DoesNotExist:
-                raise Http404
-            except Cart.DoesNotExist:
-                raise Http404
         # wrong request
         else:
             raise Http404("Something went wrong!")
@@ -118,66 +330,94 @@ class CartDeleteView(LoginRequiredMixin, TemplateView):
         return redirect(self.success_url)
 
 
-class OrderListView(LoginRequiredMixin, ListView):
+class OrderListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Order
     template_name = "ecommerce/order_list.html.haml"
+    read_replica = True
+    context_object_name = 'order_list'
+    # Newest first, served by the (user, date) index
+    ordering = ('-date', '-pk')
 
     def get_queryset(self):
-        return self.model.objects.filter(user=self.request.user)
+        return self.model.objects.filter(user=self.request.user).with_item_totals()
 
 
 class OrderDetailView(LoginRequiredMixin, DetailView):
     template_name = "ecommerce/order_detail.html.haml"
+    read_replica = True
     model = Order
 
+    def get_queryset(self):
+        # The lines carry a snapshot of the products, so Product is not read
+        return self.model.objects.filter(user=self.request.user).prefetch_related(
+            Order.order_list_prefetch())
+
 
 class CheckoutPageView(LoginRequiredMixin, TemplateView):
     template_name = 'ecommerce/checkout.html.haml'
 
     def get_cart_list(self):
-        return Cart.objects.filter(user=self.request.user)
+        return get_cart(self.request).get_items()
 
     def get(self, request, *args, **kwargs):
 
         cart_list = self.get_cart_list()
-        if cart_list.count() == 0:
+        if not cart_list:
             # Shows cart is empty
             return redirect('cart')
 
         context = self.get_context_data()
         context['wallet_balance'] = request.user.wallet_balance
         context['cart_list'] = cart_list
-        context['total_price'] = get_total_price_of_cart(cart_list)
+        context['total_price'] = get_cart(request).get_summary().total
 
         return render(request, self.template_name, context)
 
     def place_order_from_cart(self, cart_list, total_amount):
+        """
+        Places the order with a fixed number of queries whatever the size of
+        the cart: one UPDATE for the stock of every product, one INSERT for
+        the order lines and one DELETE for the cart
+        """
         if total_amount is None or total_amount <= 0 or cart_list is None:
             raise IntegrityError
-        order = Order.objects.create(user=self.request.user, amount=total_amount)
+        cart_list = sorted(cart_list, key=lambda cart_item: cart_item.product_id)
+
+        quantities = {}
+        for cart_item in cart_list:
+            quantities[cart_item.product_id] = (
+                quantities.get(cart_item.product_id, 0) + cart_item.quantity)
+        if not Product.objects.reduce_quantities(quantities):
+            raise IntegrityError
 
-        # Add items in cart to order_list
+        order = Order.objects.create(user=self.request.user, amount=total_amount)
+        order_list = []
         for cart_item in cart_list:
-            if not cart_item.product.reduce_quantity(cart_item.quantity):
-                raise IntegrityError
-            OrderList.objects.create(
-                order=order, product=cart_item.product, quantity=cart_item.quantity)
-            cart_item.delete()
+            order_item = OrderList(
+                order=order, product_id=cart_item.product_id, quantity=cart_item.quantity)
+            order_item.snapshot_product(cart_item.product)
+            order_list.append(order_item)
+        OrderList.objects.bulk_create(order_list)
+
+        # Only the items that were paid for, not ones added since the cart was read
+        Cart.objects.filter(pk__in=[cart_item.pk for cart_item in cart_list]).delete()
+        cart_summary_cache.delete(key=self.request.user.pk)
 
         return order
 
     def post(self, request, *args, **kwargs):
         cart_list = self.get_cart_list()
-        if cart_list.count() == 0:
+        if not cart_list:
             # Shows cart is empty
             return redirect('cart')
 
+        # The products were just read with the cart, so the amount charged is up to date
         total_amount = get_total_price_of_cart(cart_list)
 
         # Atomic transaction for placing order
         enough_balance = False
         try:
-            with transaction.atomic():
+            with atomic_immediate():
                 enough_balance = self.request.user.reduce_user_wallet_balance(total_amount)
                 if not enough_balance:
                     raise IntegrityError
@@ -1,34 +1,113 @@
+import json
+import os
 import random
+from concurrent.futures import ProcessPoolExecutor
 
+import django
 import requests
-import json
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
 
-from django.core.management.base import BaseCommand
 from registration.models import User
 
+DEFAULT_PASSWORD = "qwerty@123"
+
+
+def setup_worker():
+    # Worker processes that are not forked need the apps and settings too
+    django.setup()
+
 
 class Command(BaseCommand):
-    help = 'Populate db with product data from fixture'
+    help = 'Populate db with random users from uinames.com or from a local file'
 
-    def handle(self, *args, **options):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            help='JSON file listing users as {"name": ..., "surname": ...}, optionally with '
+                 '"password" and "wallet_balance"')
+        parser.add_argument(
+            '--amount', type=int, default=20, help='Number of users fetched from uinames.com')
+        parser.add_argument(
+            '--bulk', action='store_true',
+            help='Hash the passwords in a process pool and insert the users with bulk_create')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Number of processes hashing passwords in bulk mode')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of users inserted per transaction in bulk mode')
 
-        r = requests.get('https://uinames.com/api/?amount=20')
-        user_data_json = json.loads(r.text)
+    def get_user_data(self, options):
+        if options['source']:
+            try:
+                with open(options['source']) as source_file:
+                    return json.load(source_file)
+            except (OSError, ValueError) as e:
+                raise CommandError("Cannot read {0}: {1}".format(options['source'], e))
+        r = requests.get('https://uinames.com/api/?amount={0}'.format(options['amount']))
+        return json.loads(r.text)
 
+    def get_users(self, user_data_json):
+        """
+        Unsaved users with their raw password, leaving out the usernames that
+        are taken, with one query for all of them
+        """
+        using = router.db_for_write(User)
+        existing = set(User.objects.using(using).values_list('username', flat=True))
+        users = []
         for user_data in user_data_json:
             username = str(user_data['name']).lower()
-            if User.objects.filter(username=username).count() > 0:
-                break
-
-            first_name = str(user_data['name'])
-            last_name = str(user_data['surname'])
+            if username in existing:
+                continue
+            existing.add(username)
 
-            User.objects.create_user(
+            user = User(
                 username=username,
                 email="{0}@gmail.com".format(username),
-                password="qwerty@123",
-                first_name=first_name,
-                last_name=last_name,
-                wallet_balance=random.randint(100, 10000)
+                first_name=str(user_data['name']),
+                last_name=str(user_data.get('surname', '')),
+                wallet_balance=user_data.get('wallet_balance', random.randint(100, 10000))
             )
-        print("Added 20 random users")
+            users.append((user, user_data.get('password', DEFAULT_PASSWORD)))
+        return users
+
+    def hash_passwords(self, passwords, workers):
+        if workers <= 1:
+            return map(make_password, passwords)
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=setup_worker)
+        return self.executor.map(make_password, passwords, chunksize=64)
+
+    def create_users(self, users, options):
+        using = router.db_for_write(User)
+        batch_size = options['batch_size']
+        self.executor = None
+        try:
+            hashes = self.hash_passwords([password for _, password in users], options['workers'])
+            batch = []
+            for (user, _), password_hash in zip(users, hashes):
+                user.password = password_hash
+                batch.append(user)
+                if len(batch) == batch_size:
+                    with transaction.atomic(using=using):
+                        User.objects.using(using).bulk_create(batch)
+                    batch = []
+            if batch:
+                with transaction.atomic(using=using):
+                    User.objects.using(using).bulk_create(batch)
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+
+    def handle(self, *args, **options):
+        users = self.get_users(self.get_user_data(options))
+
+        if options['bulk']:
+            self.create_users(users, options)
+        else:
+            for user, password in users:
+                user.set_password(password)
+                user.save()
+
+        self.stdout.write("Added {0} random users".format(len(users)))
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.auth.models import AbstractUser
 
 
@@ -6,8 +7,26 @@ class User(AbstractUser):
     wallet_balance = models.IntegerField(default=0)
 
     def reduce_user_wallet_balance(self, order_price):
-        if 0 < order_price <= self.wallet_balance:
+        """
+        Debits the wallet with a single conditional UPDATE, which only
+        succeeds when the balance stored in the database is enough
+        """
+        if order_price <= 0:
+            return False
+        updated = User.objects.filter(pk=self.pk, wallet_balance__gte=order_price).update(
+            wallet_balance=F('wallet_balance') - order_price)
+        if updated:
             self.wallet_balance -= order_price
-            self.save()
-            return True
-        return False
+        return bool(updated)
+
+    def credit_user_wallet_balance(self, amount):
+        """
+        Credits the wallet, e.g. to refund an order, with a single UPDATE
+        """
+        if amount <= 0:
+            return False
+        updated = User.objects.filter(pk=self.pk).update(
+            wallet_balance=F('wallet_balance') + amount)
+        if updated:
+            self.wallet_balance += amount
+        return bool(updated)
@@ -0,0 +1,51 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from registration.models import User
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class TestLoadUserData(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.source = os.path.join(directory.name, 'users.json')
+        with open(self.source, 'w') as source_file:
+            json.dump([
+                {'name': 'Existing', 'surname': 'User'},
+                {'name': 'Alice', 'surname': 'Smith', 'wallet_balance': 500},
+                {'name': 'Bob', 'surname': 'Jones', 'password': 'secret@123'},
+                {'name': 'alice', 'surname': 'Again'},
+            ], source_file)
+        User.objects.create_user(username="existing", password="password")
+
+    def load(self, **options):
+        stdout = StringIO()
+        call_command('load_user_data', source=self.source, stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def assertUsersAreCreated(self):
+        self.assertEqual(3, User.objects.count())
+        alice = User.objects.get(username="alice")
+        self.assertEqual(
+            ("Alice", "Smith", "alice@gmail.com", 500),
+            (alice.first_name, alice.last_name, alice.email, alice.wallet_balance))
+        self.assertTrue(alice.check_password("qwerty@123"))
+        self.assertTrue(User.objects.get(username="bob").check_password("secret@123"))
+
+    def test_load_one_by_one(self):
+        self.assertIn("Added 2 random users", self.load())
+        self.assertUsersAreCreated()
+
+    def test_bulk_load(self):
+        self.assertIn("Added 2 random users", self.load(bulk=True, workers=1, batch_size=1))
+        self.assertUsersAreCreated()
+
+    def test_bulk_load_hashes_in_processes(self):
+        self.load(bulk=True, workers=2)
+        self.assertUsersAreCreated()
@@ -31,3 +31,29 @@ class TestUserModel(TestCase):
         order_amount = 150
         self.assertFalse(self.user.reduce_user_wallet_balance(order_amount))
         self.assertEqual(self.initial_wallet_balance, self.user.wallet_balance)
+
+    def test_reduce_wallet_balance_uses_stored_balance(self):
+        # Another checkout spent the balance after this instance was loaded
+        User.objects.filter(pk=self.user.pk).update(wallet_balance=20)
+        self.assertFalse(self.user.reduce_user_wallet_balance(50))
+        self.user.refresh_from_db()
+        self.assertEqual(20, self.user.wallet_balance)
+
+    def test_reduce_wallet_balance_is_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(self.user.reduce_user_wallet_balance(50))
+        self.user.refresh_from_db()
+        self.assertEqual(self.initial_wallet_balance - 50, self.user.wallet_balance)
+
+    def test_credit_wallet_balance(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(self.user.credit_user_wallet_balance(30))
+        self.assertEqual(self.initial_wallet_balance + 30, self.user.wallet_balance)
+        self.user.refresh_from_db()
+        self.assertEqual(self.initial_wallet_balance + 30, self.user.wallet_balance)
+
+    def test_credit_wallet_balance_with_negative_amount(self):
+        self.assertFalse(self.user.credit_user_wallet_balance(-30))
+        self.assertFalse(self.user.credit_user_wallet_balance(0))
+        self.user.refresh_from_db()
+        self.assertEqual(self.initial_wallet_balance, self.user.wallet_balance)
@@ -0,0 +1,7 @@
+from django.contrib.staticfiles.apps import StaticFilesConfig
+
+
+class WebsiteStaticFilesConfig(StaticFilesConfig):
+    # Sources of the stylesheets shipped with Bootstrap and Font Awesome are
+    # not used by any page, collectstatic leaves them out
+    ignore_patterns = StaticFilesConfig.ignore_patterns + ['*.less', '*.scss']
@@ -0,0 +1,66 @@
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+from hamlpy import HAML_EXTENSIONS
+from hamlpy.compiler import Compiler
+
+
+def find_haml_templates():
+    """
+    (template name, path) of the HAML templates in TEMPLATES DIRS and in the
+    templates directory of the project's apps, the first one of each name
+    like the loaders find it
+    """
+    template_dirs = [
+        template_dir for engine in settings.TEMPLATES for template_dir in engine.get('DIRS', [])]
+    template_dirs += [
+        os.path.join(app_config.path, 'templates') for app_config in apps.get_app_configs()
+        if app_config.path.startswith(settings.BASE_DIR)]
+
+    names = set()
+    for template_dir in template_dirs:
+        for directory, _, filenames in sorted(os.walk(template_dir)):
+            for filename in sorted(filenames):
+                if os.path.splitext(filename)[1].lstrip('.') not in HAML_EXTENSIONS:
+                    continue
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, template_dir).replace(os.sep, '/')
+                if name not in names:
+                    names.add(name)
+                    yield name, path
+
+
+def compile_templates(output_dir):
+    """
+    Writes the Django template each HAML template converts to under
+    `output_dir`, with the same name, and yields the names
+    """
+    # The options the HamlPy loaders read from the settings
+    from hamlpy.template.loaders import options
+
+    for name, path in find_haml_templates():
+        with open(path, encoding='utf-8') as haml_file:
+            html = Compiler(options=options).process(haml_file.read())
+        output_path = os.path.join(output_dir, *name.split('/'))
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8') as output_file:
+            output_file.write(html)
+        yield name
+
+
+def warm_up_templates():
+    """
+    Loads every HAML template into the cached loader, so that no request
+    pays for reading and compiling one. Returns how many were loaded, 0 when
+    the loaders are not cached.
+    """
+    engine = engines['django'].engine
+    if not any(isinstance(loader, CachedLoader) for loader in engine.template_loaders):
+        return 0
+    names = [name for name, _ in find_haml_templates()]
+    for name in names:
+        engine.get_template(name)
+    return len(names)
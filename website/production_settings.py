@@ -0,0 +1,41 @@
+import copy
+import os
+
+from .settings import *             # NOQA
+from .settings import BASE_DIR, COMPILED_TEMPLATES_DIR, TEMPLATES
+
+DEBUG = False
+
+ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', 'localhost').split(',')
+
+# SQLite with WAL and the pragmas of website.sqlite3.base.DEFAULT_PRAGMAS,
+# each worker keeps its connection for the next requests
+DATABASES = {
+    'default': {
+        'ENGINE': 'website.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
+    }
+}
+
+# A copy of db.sqlite3 kept up to date by a replication tool, the catalog and
+# order pages read from it
+if os.environ.get('SQLITE_REPLICA_PATH'):
+    DATABASES['replica'] = dict(DATABASES['default'], NAME=os.environ['SQLITE_REPLICA_PATH'])
+    DATABASE_REPLICA = 'replica'
+
+# collectstatic writes hashed names, listed in STATIC_ROOT/staticfiles.json,
+# with gzip and Brotli copies served by website.views.serve_static
+STATICFILES_STORAGE = 'website.storage.CompressedManifestStaticFilesStorage'
+
+# Templates are compiled ahead of time by compile_templates, and the HAML
+# loaders only convert the ones missing. Every template is kept in memory
+# once loaded, website.wsgi loads them all when a worker starts.
+TEMPLATES = copy.deepcopy(TEMPLATES)
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        ('django.template.loaders.filesystem.Loader', [COMPILED_TEMPLATES_DIR]),
+        'hamlpy.template.loaders.HamlPyFilesystemLoader',
+        'hamlpy.template.loaders.HamlPyAppDirectoriesLoader',
+    ]),
+]
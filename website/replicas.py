@@ -0,0 +1,87 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Set on the browser of a visitor whose request wrote to the primary
+PIN_COOKIE = 'use_primary'
+
+# Models read from the replica on every page, they only change in the admin
+REPLICA_MODELS = {'ecommerce.ProductCategory'}
+
+_routing = ContextVar('database_routing', default=None)
+
+
+class RequestRouting:
+    """
+    Routing state of the request being handled
+    """
+
+    def __init__(self, pinned):
+        # The visitor wrote recently, the replica may not have their changes yet
+        self.pinned = pinned
+        self.replica_view = False
+        self.wrote = False
+
+
+class ReplicaRouter:
+    """
+    Sends the writes to the primary. Reads go to the DATABASE_REPLICA alias
+    in the views with `read_replica = True`, and for REPLICA_MODELS in every
+    view, until the request writes or when the visitor wrote recently.
+    Outside of requests everything uses the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        replica = getattr(settings, 'DATABASE_REPLICA', None)
+        if routing is None or replica is None or routing.pinned or routing.wrote:
+            return None
+        if routing.replica_view or model._meta.label in REPLICA_MODELS:
+            return replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        aliases = {DEFAULT_DB_ALIAS, getattr(settings, 'DATABASE_REPLICA', None)}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Tracks the routing state of each request for ReplicaRouter, and pins the
+    visitor to the primary for DATABASE_REPLICA_PIN_SECONDS after a request
+    that wrote, such as adding to the cart or checking out
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routing = RequestRouting(pinned=PIN_COOKIE in request.COOKIES)
+        token = _routing.set(routing)
+        try:
+            # Templates of the views are rendered in here too
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if routing.wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 10),
+                httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = _routing.get()
+        view_class = getattr(view_func, 'view_class', view_func)
+        if (routing is not None and getattr(view_class, 'read_replica', False)
+                and request.method in ('GET', 'HEAD')):
+            routing.replica_view = True
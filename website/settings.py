@@ -36,7 +36,7 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'django.contrib.staticfiles',
+    'website.apps.WebsiteStaticFilesConfig',
     'django.contrib.sites',
     'registration',
 
@@ -49,15 +49,17 @@ INSTALLED_APPS = [
 
     # My apps
     # 'registration',
-    'ecommerce',
+    'ecommerce.apps.EcommerceConfig',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'website.replicas.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'ecommerce.carts.CartMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -84,6 +86,10 @@ TEMPLATES = [
     },
 ]
 
+# The compile_templates command writes the Django templates the HAML templates
+# convert to here, website.production_settings loads them with a cached loader
+COMPILED_TEMPLATES_DIR = os.path.join(BASE_DIR, 'compiled_templates')
+
 WSGI_APPLICATION = 'website.wsgi.application'
 
 
@@ -97,6 +103,47 @@ DATABASES = {
     }
 }
 
+# Writes go to `default`. With DATABASE_REPLICA set to another alias of
+# DATABASES, the views with `read_replica = True` read from it, except for a
+# visitor who wrote in the last DATABASE_REPLICA_PIN_SECONDS.
+DATABASE_ROUTERS = ['website.replicas.ReplicaRouter']
+DATABASE_REPLICA = None
+DATABASE_REPLICA_PIN_SECONDS = 10
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Shared by every worker process, so that a change saved in one process
+    # invalidates the navbar, banners and catalog pages cached by all of them.
+    # The file based cache works for workers on one machine, set
+    # ECOMMERCE_CACHE_BACKEND / ECOMMERCE_CACHE_LOCATION to use memcached when
+    # running on several machines.
+    'ecommerce': {
+        'BACKEND': os.environ.get(
+            'ECOMMERCE_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('ECOMMERCE_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
+    },
+}
+
+# Cache alias used by ecommerce.cache. Pointing it to a per-process cache such
+# as LocMemCache makes invalidation per-process: other workers keep serving
+# their copy until it expires after ECOMMERCE_CACHE_TIMEOUT seconds.
+ECOMMERCE_CACHE = 'ecommerce'
+ECOMMERCE_CACHE_TIMEOUT = 300
+
+# Where the cart of anonymous visitors is kept, logged in users always use the
+# database. ecommerce.carts.CacheCartStorage keeps it in ECOMMERCE_CACHE.
+ECOMMERCE_ANONYMOUS_CART_STORAGE = 'ecommerce.carts.SignedCookieCartStorage'
+
+# Processes making the resized and WebP copies of uploaded product images in
+# the background, see ecommerce.images. 0 makes them during the request.
+ECOMMERCE_IMAGE_WORKERS = 2
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -135,9 +182,17 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.1/howto/static-files/
 
 STATIC_URL = '/static/'
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 
+# How website.views.serve_media hands media files to the front proxy instead
+# of streaming them from a worker: None, 'x-accel-redirect' for nginx, with an
+# internal location MEDIA_ACCEL_REDIRECT_URL aliased to MEDIA_ROOT, or
+# 'x-sendfile' for Apache mod_xsendfile and lighttpd.
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_REDIRECT_URL = '/protected-media/'
+
 
 AUTH_USER_MODEL = 'registration.User'
 
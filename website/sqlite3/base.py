@@ -0,0 +1,62 @@
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.backends.sqlite3 import base
+
+# Set on every new connection, OPTIONS['pragmas'] of the database overrides them
+DEFAULT_PRAGMAS = {
+    # Readers keep reading while a writer commits, instead of waiting for it
+    'journal_mode': 'WAL',
+    # Safe with WAL, only a power loss can undo the last commits
+    'synchronous': 'NORMAL',
+    # Milliseconds a statement waits for a lock before failing
+    'busy_timeout': 5000,
+    # Pages cache of each connection, negative values are KiB
+    'cache_size': -20000,
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend tuned for serving requests from several workers
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Set by atomic_immediate() for the transaction about to begin
+        self.begin_immediate = False
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop('pragmas', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        pragmas = dict(DEFAULT_PRAGMAS, **self.settings_dict['OPTIONS'].get('pragmas', {}))
+        for name, value in pragmas.items():
+            conn.execute('PRAGMA {0} = {1}'.format(name, value))
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute("BEGIN IMMEDIATE" if self.begin_immediate else "BEGIN")
+
+
+@contextmanager
+def atomic_immediate(using=None):
+    """
+    transaction.atomic() which takes the write lock when it begins on this
+    backend. A transaction that reads before writing otherwise fails with
+    "database is locked", without waiting, when another one writes first.
+    Nested blocks, and other backends, get a plain atomic block.
+    """
+    connection = transaction.get_connection(using)
+    connection.begin_immediate = (
+        isinstance(connection, DatabaseWrapper) and not connection.in_atomic_block)
+    try:
+        with transaction.atomic(using=using):
+            connection.begin_immediate = False
+            yield
+    finally:
+        connection.begin_immediate = False
@@ -0,0 +1,46 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    # Only the gzip copies are written without the Brotli package
+    brotli = None
+
+# Formats that are not compressed already, fonts like woff2 and images are
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.map', '.svg', '.txt', '.html', '.json', '.xml', '.eot', '.ttf', '.otf')
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Stores the static files under names holding a hash of their content, as
+    listed in the manifest, along with .gz and .br copies of the text ones
+    for website.views.serve_static
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # Compressed once every hashed name is final
+        for hashed_name in sorted(set(self.hashed_files.values())):
+            if hashed_name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.compress(hashed_name)
+
+    def compress(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as original:
+            content = original.read()
+        compressed = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            compressed.append(('.br', brotli.compress(content)))
+        for extension, compressed_content in compressed:
+            # A copy that is not smaller is of no use
+            if len(compressed_content) < len(content):
+                with open(path + extension, 'wb') as compressed_file:
+                    compressed_file.write(compressed_content)
+            elif os.path.exists(path + extension):
+                os.remove(path + extension)
@@ -2,9 +2,27 @@ from .settings import *             # NOQA
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'website.sqlite3',
         'NAME': ':memory:'
+    },
+    # Shares the test database of `default`. Its connection does not see what
+    # TestCase has not committed, so only the tests enabling DATABASE_REPLICA
+    # read from it, in a TransactionTestCase.
+    'replica': {
+        'ENGINE': 'website.sqlite3',
+        'NAME': ':memory:',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
     }
 }
 
+ECOMMERCE_CACHE = 'default'
+
+ECOMMERCE_IMAGE_WORKERS = 0
+
 EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
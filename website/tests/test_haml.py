@@ -0,0 +1,74 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.template import engines
+from django.test import TestCase, override_settings
+
+from website.haml import find_haml_templates, warm_up_templates
+
+
+def cached_templates(compiled_templates_dir):
+    return [{
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'OPTIONS': dict(settings.TEMPLATES[0]['OPTIONS'], loaders=[
+            ('django.template.loaders.cached.Loader', [
+                ('django.template.loaders.filesystem.Loader', [compiled_templates_dir]),
+                'hamlpy.template.loaders.HamlPyFilesystemLoader',
+                'hamlpy.template.loaders.HamlPyAppDirectoriesLoader',
+            ]),
+        ]),
+    }]
+
+
+class TestCompileTemplates(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output_dir = directory.name
+
+    def test_templates_of_the_project_apps_are_found(self):
+        names = dict(find_haml_templates())
+
+        self.assertIn('ecommerce/cart.html.haml', names)
+        self.assertIn('base/base.haml', names)
+        self.assertIn('account/login.html.haml', names)
+        self.assertFalse(any(name.endswith('.txt') for name in names))
+        # hamlpy ships test templates, they are not part of the site
+        self.assertFalse(any('hamlpy' in path for path in names.values()))
+
+    def test_templates_are_compiled(self):
+        stdout = StringIO()
+        call_command('compile_templates', output_dir=self.output_dir, stdout=stdout)
+
+        self.assertIn("Done, {0} templates compiled".format(len(list(find_haml_templates()))),
+                      stdout.getvalue())
+        with open(os.path.join(self.output_dir, 'ecommerce', 'cart.html.haml')) as compiled:
+            html = compiled.read()
+        self.assertTrue(html.startswith("{% extends 'base/base.haml' %}"))
+
+    def test_compiled_templates_are_used(self):
+        os.makedirs(os.path.join(self.output_dir, 'ecommerce'))
+        with open(os.path.join(self.output_dir, 'ecommerce', 'cart.html.haml'), 'w') as compiled:
+            compiled.write("<p>{{ name }}</p>")
+
+        with override_settings(TEMPLATES=cached_templates(self.output_dir)):
+            html = engines['django'].get_template('ecommerce/cart.html.haml').render(
+                {'name': "compiled"})
+        self.assertEqual("<p>compiled</p>", html)
+
+
+class TestWarmUpTemplates(TestCase):
+    def test_loaders_are_not_cached(self):
+        self.assertEqual(0, warm_up_templates())
+
+    def test_templates_are_cached(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with override_settings(TEMPLATES=cached_templates(directory.name)):
+            count = warm_up_templates()
+            cached_loader = engines['django'].engine.template_loaders[0]
+            self.assertEqual(len(list(find_haml_templates())), count)
+            self.assertIn('ecommerce/cart.html.haml', cached_loader.get_template_cache)
@@ -0,0 +1,115 @@
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ecommerce.models import Product, ProductCategory, Order
+from registration.models import User
+from website.replicas import PIN_COOKIE, ReplicaRouter, RequestRouting, _routing
+
+
+def get_tables(queries):
+    return ' '.join(query['sql'] for query in queries)
+
+
+@override_settings(DATABASE_REPLICA='replica')
+class TestReplicaRouter(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.routing = RequestRouting(pinned=False)
+        token = _routing.set(self.routing)
+        self.addCleanup(_routing.reset, token)
+
+    def test_outside_of_requests_the_primary_is_used(self):
+        _routing.set(None)
+        self.assertIsNone(self.router.db_for_read(ProductCategory))
+
+    def test_replica_views(self):
+        self.assertIsNone(self.router.db_for_read(Product))
+        self.assertEqual('replica', self.router.db_for_read(ProductCategory))
+
+        self.routing.replica_view = True
+        self.assertEqual('replica', self.router.db_for_read(Product))
+
+    def test_reads_after_a_write_use_the_primary(self):
+        self.routing.replica_view = True
+
+        self.assertEqual('default', self.router.db_for_write(Product))
+        self.assertTrue(self.routing.wrote)
+        self.assertIsNone(self.router.db_for_read(Product))
+
+    def test_pinned_visitor_uses_the_primary(self):
+        self.routing.pinned = self.routing.replica_view = True
+
+        self.assertIsNone(self.router.db_for_read(Product))
+        self.assertIsNone(self.router.db_for_read(ProductCategory))
+
+    @override_settings(DATABASE_REPLICA=None)
+    def test_no_replica(self):
+        self.routing.replica_view = True
+        self.assertIsNone(self.router.db_for_read(Product))
+
+    def test_relations_between_primary_and_replica(self):
+        category = ProductCategory(name="Toys")
+        product = Product(name="Ball")
+        category._state.db, product._state.db = 'replica', 'default'
+
+        self.assertTrue(self.router.allow_relation(category, product))
+        category._state.db = 'other'
+        self.assertIsNone(self.router.allow_relation(category, product))
+
+
+@override_settings(DATABASE_REPLICA='replica')
+class TestReplicaRouting(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        category = ProductCategory.objects.create(name="Toys")
+        self.product = Product.objects.create(
+            name="Ball", price=100, discount_percent=0, quantity=10, rating=1, category=category)
+        self.user = User.objects.create_user(
+            username="user", password="password", wallet_balance=1000)
+        self.client.force_login(self.user)
+
+    def get(self, url):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(url)
+        self.assertEqual(200, response.status_code)
+        return response, get_tables(primary), get_tables(replica)
+
+    def test_catalog_reads_from_the_replica(self):
+        response, primary, replica = self.get(reverse('home'))
+
+        self.assertIn('"ecommerce_product"', replica)
+        self.assertIn('"ecommerce_productcategory"', replica)
+        self.assertNotIn('"ecommerce_product"', primary)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_order_pages_read_from_the_replica(self):
+        order = Order.objects.create(user=self.user, amount=100)
+
+        _, primary, replica = self.get(reverse('order_list'))
+        self.assertIn('"ecommerce_order"', replica)
+        self.assertNotIn('"ecommerce_order"', primary)
+
+        _, primary, replica = self.get(reverse('order_detail', args=[order.pk]))
+        self.assertIn('"ecommerce_order"', replica)
+        self.assertNotIn('"ecommerce_order"', primary)
+
+    def test_other_views_read_categories_from_the_replica(self):
+        _, primary, replica = self.get(reverse('cart'))
+
+        self.assertIn('"ecommerce_productcategory"', replica)
+        self.assertNotIn('"ecommerce_productcategory"', primary)
+        self.assertIn('"ecommerce_cart"', primary)
+
+    def test_visitor_is_pinned_to_the_primary_after_a_write(self):
+        response = self.client.post(reverse('add_to_cart'), {'product': self.product.pk})
+
+        self.assertEqual('1', response.cookies[PIN_COOKIE].value)
+        self.assertEqual(10, response.cookies[PIN_COOKIE]['max-age'])
+
+        _, primary, replica = self.get(reverse('home'))
+        self.assertIn('"ecommerce_product"', primary)
+        self.assertEqual('', replica)
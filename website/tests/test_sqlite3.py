@@ -0,0 +1,86 @@
+import os
+import tempfile
+
+from django.db import OperationalError, connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from website.sqlite3.base import DatabaseWrapper, atomic_immediate
+
+
+def get_pragma(conn, name):
+    return conn.execute('PRAGMA {0}'.format(name)).fetchone()[0]
+
+
+class TestDatabaseWrapper(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.name = os.path.join(directory.name, 'db.sqlite3')
+
+    def connect(self, **pragmas):
+        settings_dict = dict(
+            connections['default'].settings_dict, NAME=self.name, OPTIONS={'pragmas': pragmas})
+        wrapper = DatabaseWrapper(settings_dict, alias='tuned')
+        wrapper.ensure_connection()
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_pragmas_are_set(self):
+        conn = self.connect().connection
+
+        self.assertEqual('wal', get_pragma(conn, 'journal_mode'))
+        # NORMAL
+        self.assertEqual(1, get_pragma(conn, 'synchronous'))
+        self.assertEqual(5000, get_pragma(conn, 'busy_timeout'))
+        self.assertEqual(-20000, get_pragma(conn, 'cache_size'))
+        self.assertEqual(1, get_pragma(conn, 'foreign_keys'))
+
+    def test_pragmas_are_overridden(self):
+        conn = self.connect(busy_timeout=0, synchronous='FULL').connection
+
+        self.assertEqual(0, get_pragma(conn, 'busy_timeout'))
+        self.assertEqual(2, get_pragma(conn, 'synchronous'))
+
+    def test_immediate_transaction_takes_the_write_lock(self):
+        writer, other = self.connect(), self.connect(busy_timeout=0)
+        writer.connection.execute('CREATE TABLE item (name TEXT)')
+
+        writer.begin_immediate = True
+        writer.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+        try:
+            with self.assertRaisesMessage(OperationalError, 'database is locked'):
+                with other.cursor() as cursor:
+                    cursor.execute("INSERT INTO item VALUES ('other')")
+            # Readers are not blocked with WAL
+            with other.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM item")
+        finally:
+            writer.rollback()
+            writer.set_autocommit(True)
+
+
+class TestAtomicImmediate(TransactionTestCase):
+    def get_statements(self):
+        context = CaptureQueriesContext(connection)
+        with context:
+            with atomic_immediate():
+                with atomic_immediate():
+                    connection.cursor().execute("SELECT 1")
+            with atomic_immediate():
+                connection.cursor().execute("SELECT 2")
+        return [query['sql'] for query in context.captured_queries]
+
+    def test_outer_blocks_begin_immediate(self):
+        self.assertEqual([
+            'BEGIN IMMEDIATE', 'SAVEPOINT', 'SELECT 1', 'RELEASE SAVEPOINT',
+            'BEGIN IMMEDIATE', 'SELECT 2',
+        ], [sql.split(' "')[0] for sql in self.get_statements()])
+        self.assertFalse(connection.begin_immediate)
+
+    def test_flag_is_reset_when_the_transaction_fails(self):
+        with self.assertRaises(ValueError):
+            with atomic_immediate():
+                raise ValueError
+        self.assertFalse(connection.begin_immediate)
+        self.assertFalse(connection.in_atomic_block)
@@ -0,0 +1,94 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from website.storage import brotli
+from website.views import get_accepted_encodings
+
+STATIC_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(
+    STATIC_ROOT=STATIC_ROOT,
+    STATICFILES_STORAGE='website.storage.CompressedManifestStaticFilesStorage')
+class TestStaticFiles(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(STATIC_ROOT, 'staticfiles.json')) as manifest:
+            cls.paths = json.load(manifest)['paths']
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(STATIC_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def get(self, path, **headers):
+        return self.client.get('/static/' + path, **headers)
+
+    def test_sources_are_left_out(self):
+        self.assertIn('base/css/bootstrap.css', self.paths)
+        self.assertFalse(any(path.endswith(('.less', '.scss')) for path in self.paths))
+        self.assertFalse(os.path.exists(os.path.join(STATIC_ROOT, 'base/font-awesome/less')))
+
+    def test_compressed_copies(self):
+        path = os.path.join(STATIC_ROOT, self.paths['base/css/bootstrap.css'])
+        with open(path, 'rb') as original, gzip.open(path + '.gz') as compressed:
+            self.assertEqual(original.read(), compressed.read())
+        self.assertEqual(brotli is not None, os.path.exists(path + '.br'))
+        # woff2 is compressed already
+        woff2 = os.path.join(
+            STATIC_ROOT, self.paths['base/font-awesome/fonts/fontawesome-webfont.woff2'])
+        self.assertFalse(os.path.exists(woff2 + '.gz'))
+
+    def test_hashed_name_is_immutable(self):
+        response = self.get(self.paths['base/css/bootstrap.css'])
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('text/css', response['Content-Type'])
+        self.assertNotIn('Content-Encoding', response)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        self.assertEqual('Accept-Encoding', response['Vary'])
+
+    def test_original_name_is_revalidated(self):
+        response = self.get('base/css/bootstrap.css')
+
+        self.assertEqual('no-cache', response['Cache-Control'])
+        self.assertEqual(
+            304, self.get('base/css/bootstrap.css', HTTP_IF_NONE_MATCH=response['ETag'])
+            .status_code)
+
+    def test_gzip_copy_is_served(self):
+        path = self.paths['base/css/bootstrap.css']
+        response = self.get(path, HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual('gzip', response['Content-Encoding'])
+        self.assertEqual('text/css', response['Content-Type'])
+        with open(os.path.join(STATIC_ROOT, path), 'rb') as original:
+            self.assertEqual(
+                original.read(), gzip.decompress(b''.join(response.streaming_content)))
+        # Each copy has its own validator
+        self.assertNotEqual(self.get(path)['ETag'], response['ETag'])
+
+    def test_refused_encoding(self):
+        response = self.get(
+            self.paths['base/css/bootstrap.css'], HTTP_ACCEPT_ENCODING='gzip;q=0, br;q=0')
+
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_missing_file(self):
+        self.assertEqual(404, self.get('base/css/missing.css').status_code)
+
+
+class TestAcceptedEncodings(TestCase):
+    def test_accepted_encodings(self):
+        self.assertEqual({'gzip', 'br'}, get_accepted_encodings('gzip, deflate;q=0, br;q=0.5'))
+        self.assertEqual({'gzip'}, get_accepted_encodings('GZIP;q=1.0, br;q=x'))
+        self.assertEqual(set(), get_accepted_encodings(''))
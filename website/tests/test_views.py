@@ -0,0 +1,121 @@
+import os
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.utils.http import http_date
+
+from website.views import parse_range
+
+
+class TestParseRange(TestCase):
+    def test_ranges(self):
+        self.assertEqual((0, 9), parse_range('bytes=0-9', 100))
+        self.assertEqual((90, 99), parse_range('bytes=90-', 100))
+        self.assertEqual((90, 99), parse_range('bytes=-10', 100))
+        self.assertEqual((0, 99), parse_range('bytes=-1000', 100))
+        self.assertEqual((50, 99), parse_range('bytes=50-1000', 100))
+
+    def test_ignored_ranges(self):
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 100))
+        self.assertIsNone(parse_range('items=0-1', 100))
+        self.assertIsNone(parse_range('bytes=-', 100))
+        self.assertIsNone(parse_range('bytes=9-1', 100))
+
+    def test_unsatisfiable_ranges(self):
+        for header in ('bytes=100-', 'bytes=-0'):
+            with self.assertRaises(ValueError):
+                parse_range(header, 100)
+
+
+class TestServeMedia(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        os.makedirs(os.path.join(directory.name, 'products'))
+        self.path = os.path.join(directory.name, 'products', 'ball.jpg')
+        with open(self.path, 'wb') as image:
+            image.write(bytes(range(100)))
+        os.utime(self.path, (1500000000, 1500000000))
+
+        media_settings = override_settings(MEDIA_ROOT=directory.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def get(self, **headers):
+        return self.client.get('/media/products/ball.jpg', **headers)
+
+    def test_file_is_served_with_validators(self):
+        response = self.get()
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(bytes(range(100)), b''.join(response.streaming_content))
+        self.assertEqual('image/jpeg', response['Content-Type'])
+        self.assertEqual(http_date(1500000000), response['Last-Modified'])
+        self.assertEqual('bytes', response['Accept-Ranges'])
+        self.assertTrue(response['ETag'].startswith('"'))
+
+    def test_missing_files_and_directories(self):
+        self.assertEqual(404, self.client.get('/media/products/missing.jpg').status_code)
+        self.assertEqual(404, self.client.get('/media/products/').status_code)
+        self.assertEqual(404, self.client.get('/media/../settings.py').status_code)
+
+    def test_only_safe_methods(self):
+        self.assertEqual(405, self.client.post('/media/products/ball.jpg').status_code)
+
+    def test_not_modified(self):
+        etag = self.get()['ETag']
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(etag, response['ETag'])
+        self.assertEqual(
+            304, self.get(HTTP_IF_MODIFIED_SINCE=http_date(1500000000)).status_code)
+        self.assertEqual(200, self.get(HTTP_IF_NONE_MATCH='"other"').status_code)
+
+    def test_changed_file_has_another_etag(self):
+        etag = self.get()['ETag']
+        os.utime(self.path, (1600000000, 1600000000))
+
+        self.assertEqual(200, self.get(HTTP_IF_NONE_MATCH=etag).status_code)
+
+    def test_range(self):
+        response = self.get(HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(206, response.status_code)
+        self.assertEqual(bytes(range(10, 20)), b''.join(response.streaming_content))
+        self.assertEqual('10', response['Content-Length'])
+        self.assertEqual('bytes 10-19/100', response['Content-Range'])
+        self.assertEqual('image/jpeg', response['Content-Type'])
+
+    def test_unsatisfiable_range(self):
+        response = self.get(HTTP_RANGE='bytes=200-')
+
+        self.assertEqual(416, response.status_code)
+        self.assertEqual('bytes */100', response['Content-Range'])
+
+    def test_range_of_a_changed_file_is_not_served(self):
+        etag = self.get()['ETag']
+
+        self.assertEqual(206, self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag).status_code)
+        self.assertEqual(
+            200, self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"other"').status_code)
+        self.assertEqual(
+            200, self.get(HTTP_RANGE='bytes=0-9',
+                          HTTP_IF_RANGE=http_date(1400000000)).status_code)
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect', MEDIA_ACCEL_REDIRECT_URL='/internal/')
+    def test_x_accel_redirect(self):
+        response = self.get()
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(b'', response.content)
+        self.assertEqual('/internal/products/ball.jpg', response['X-Accel-Redirect'])
+        self.assertEqual('image/jpeg', response['Content-Type'])
+        self.assertIn('ETag', response)
+
+    @override_settings(MEDIA_SENDFILE='x-sendfile')
+    def test_x_sendfile(self):
+        response = self.get()
+
+        self.assertEqual(self.path, response['X-Sendfile'])
+        self.assertEqual(304, self.get(HTTP_IF_NONE_MATCH=response['ETag']).status_code)
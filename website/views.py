@@ -0,0 +1,221 @@
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+CHUNK_SIZE = 64 * 1024
+
+# A year, the longest lifetime caches are asked to keep a response for
+STATIC_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def get_etag(file_stat):
+    # Changes whenever the file is replaced or rewritten
+    return '"{0:x}-{1:x}"'.format(file_stat.st_mtime_ns, file_stat.st_size)
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single `bytes=` range, end included, None for a header
+    that is ignored and the whole file served. Raises ValueError when the
+    range is outside of the file.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        # Several ranges, or other units, are allowed to be ignored
+        return None
+    if size == 0:
+        raise ValueError("Empty file")
+    first, last = match.groups()
+    if first == '':
+        # The last N bytes
+        if int(last) == 0:
+            raise ValueError("Empty range")
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("Range starts after the end of the file")
+    return start, end
+
+
+def is_range_fresh(request, etag, last_modified):
+    """
+    Whether the file still is the one the If-Range header of the request
+    describes, the range is only served then
+    """
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is None:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def read_range(file, start, length):
+    with file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def sendfile_response(path, full_path):
+    """
+    Empty response telling the front proxy to send the file itself, None
+    when MEDIA_SENDFILE is not set
+    """
+    sendfile = getattr(settings, 'MEDIA_SENDFILE', None)
+    if sendfile == 'x-accel-redirect':
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = quote(
+            getattr(settings, 'MEDIA_ACCEL_REDIRECT_URL', '/protected-media/') + path)
+        return response
+    if sendfile == 'x-sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = full_path
+        return response
+    return None
+
+
+def get_file_stat(root, path):
+    """
+    Absolute path and stat of a regular file under `root`, raises Http404
+    for anything else
+    """
+    try:
+        full_path = safe_join(root, path)
+        file_stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404("File not found")
+    if not stat.S_ISREG(file_stat.st_mode):
+        raise Http404("File not found")
+    return full_path, file_stat
+
+
+def file_response(request, full_path, file_stat, content_type, encoding=None, offload=None):
+    """
+    Response for a file with validators for conditional requests and support
+    for single byte ranges. `offload` returns the response handing the file
+    to the front proxy, if any.
+    """
+    etag = get_etag(file_stat)
+    last_modified = int(file_stat.st_mtime)
+    # 304 Not Modified, or 412 for a failed If-Match
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None and offload is not None:
+        response = offload()
+    if response is None:
+        response = serve_file(request, full_path, file_stat.st_size, etag, last_modified)
+
+    if response.status_code in (200, 206):
+        response['Content-Type'] = content_type or 'application/octet-stream'
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serves a file of MEDIA_ROOT. With MEDIA_SENDFILE set, the front proxy is
+    told to send the file instead of a worker streaming it.
+    """
+    full_path, file_stat = get_file_stat(settings.MEDIA_ROOT, path)
+    content_type, encoding = mimetypes.guess_type(full_path)
+    return file_response(request, full_path, file_stat, content_type, encoding,
+                         offload=lambda: sendfile_response(path, full_path))
+
+
+def get_accepted_encodings(header):
+    """
+    Content codings of an Accept-Encoding header that are not refused with q=0
+    """
+    encodings = set()
+    for coding in header.lower().split(','):
+        coding, _, parameters = coding.partition(';')
+        quality = parameters.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding.strip():
+            encodings.add(coding.strip())
+    return encodings
+
+
+def is_hashed_name(path):
+    # Names listed in the manifest of ManifestStaticFilesStorage change with their content
+    return path in getattr(staticfiles_storage, 'hashed_files', {}).values()
+
+
+@require_safe
+def serve_static(request, path):
+    """
+    Serves a file collected in STATIC_ROOT, or its gzip or Brotli copy when
+    the client accepts it. Hashed names never change and are cached for a
+    year, the other names are revalidated.
+    """
+    full_path, file_stat = get_file_stat(settings.STATIC_ROOT, path)
+    content_type, encoding = mimetypes.guess_type(full_path)
+
+    accepted = get_accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    compressible = encoding is None and os.path.exists(full_path + '.gz')
+    if compressible:
+        for coding, extension in (('br', '.br'), ('gzip', '.gz')):
+            if coding in accepted and os.path.exists(full_path + extension):
+                full_path, file_stat = get_file_stat(settings.STATIC_ROOT, path + extension)
+                encoding = coding
+                break
+
+    response = file_response(request, full_path, file_stat, content_type, encoding)
+    if compressible:
+        patch_vary_headers(response, ['Accept-Encoding'])
+    if is_hashed_name(path):
+        patch_cache_control(response, public=True, max_age=STATIC_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+def serve_file(request, full_path, size, etag, last_modified):
+    byte_range = None
+    if 'HTTP_RANGE' in request.META and is_range_fresh(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.META['HTTP_RANGE'], size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */{0}'.format(size)
+            return response
+
+    if byte_range is None:
+        return FileResponse(open(full_path, 'rb'))
+
+    start, end = byte_range
+    length = end - start + 1
+    response = StreamingHttpResponse(read_range(open(full_path, 'rb'), start, length), status=206)
+    response['Content-Length'] = str(length)
+    response['Content-Range'] = 'bytes {0}-{1}/{2}'.format(start, end, size)
+    return response